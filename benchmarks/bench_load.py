@@ -0,0 +1,298 @@
+# Offline load/latency benchmark. Starts benchmarks/fake_groq.py, spawns src/server.py
+# pointed at it, and drives chain_of_thought over a real MCP stdio session.
+#
+#   uv run benchmarks/bench_load.py --calls 200 --concurrency 16 --output after.json
+#   uv run benchmarks/bench_load.py --calls 200 --concurrency 16 --compare before.json
+#
+# Fake server options (--ttft, --token-delay, --tokens, --error-rate, ...) are passed
+# through, see fake_groq.py.
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from mcp import ClientSession, StdioServerParameters, types
+from mcp.client.stdio import stdio_client
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import fake_groq  # noqa: E402
+from prompt_budget import count_tokens  # noqa: E402
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"fake Groq server did not start on port {port}")
+
+
+def child_pids() -> List[int]:
+    # the stdio client doesn't expose the server's pid, find it via /proc (Linux only)
+    pids = []
+    if not os.path.isdir("/proc"):
+        return pids
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        if int(fields[1]) == os.getpid() and b"server.py" in cmdline:
+            pids.append(int(entry))
+    return pids
+
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    # utime and stime, fields 14 and 15 of /proc/<pid>/stat
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    result = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    result[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return result
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace, base_url: str) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "benchmark")
+    env["GROQ_BASE_URL"] = base_url
+    if not args.cache:
+        env["THINK_CACHE"] = "0"
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    params = StdioServerParameters(
+        command=sys.executable, args=[os.path.join(ROOT, "src", "server.py")], env=env
+    )
+
+    first_token: Dict[int, float] = {}
+    calls: List[Dict[str, Any]] = []
+
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+
+            async def watch_notifications() -> None:
+                # progress notifications carry the call's progress token, the first one
+                # for a call marks when its first thought became visible to the client
+                async for message in session.incoming_messages:
+                    if isinstance(message, types.ServerNotification) and isinstance(
+                        message.root, types.ProgressNotification
+                    ):
+                        token = message.root.params.progressToken
+                        first_token.setdefault(int(token), time.perf_counter())
+
+            watcher = asyncio.create_task(watch_notifications())
+            pids = child_pids()
+            pid = pids[0] if pids else None
+            cpu_start = cpu_seconds(pid) if pid else None
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def one(i: int) -> None:
+                prompt = args.prompt if args.same_prompt else f"{args.prompt} (variant {i})"
+                request = types.ClientRequest(
+                    types.CallToolRequest(
+                        method="tools/call",
+                        params=types.CallToolRequestParams(
+                            name="chain_of_thought",
+                            arguments={"prompt": prompt},
+                            _meta=types.RequestParams.Meta(progressToken=i),
+                        ),
+                    )
+                )
+                async with semaphore:
+                    start = time.perf_counter()
+                    result = await session.send_request(request, types.CallToolResult)
+                    end = time.perf_counter()
+                text = "".join(c.text for c in result.content if isinstance(c, types.TextContent))
+                ttft = first_token[i] - start if i in first_token else None
+                tokens = count_tokens(text)
+                generation = (end - start) - (ttft or 0.0)
+                calls.append({
+                    "index": i,
+                    "ttft": ttft,
+                    "latency": end - start,
+                    "tokens": tokens,
+                    "tokens_per_second": tokens / generation if generation > 0 else None,
+                    "error": bool(result.isError or text.startswith("Error:")),
+                })
+
+            wall_start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(args.calls)))
+            wall = time.perf_counter() - wall_start
+
+            cpu_end = cpu_seconds(pid) if pid else None
+            memory = memory_kb(pid) if pid else {}
+            watcher.cancel()
+
+    ok = [c for c in calls if not c["error"]]
+    cpu = cpu_end - cpu_start if cpu_start is not None and cpu_end is not None else None
+    rates = [c["tokens_per_second"] for c in ok if c["tokens_per_second"]]
+    return {
+        "commit": git_commit(),
+        "config": {
+            "calls": args.calls,
+            "concurrency": args.concurrency,
+            "same_prompt": args.same_prompt,
+            "cache": args.cache,
+            "fake": {k: getattr(args, k) for k in ("ttft", "token_delay", "tokens", "error_rate", "rate_limit_rate")},
+            "env": args.env,
+        },
+        "summary": {
+            "wall_seconds": round(wall, 3),
+            "throughput_calls_per_second": round(len(calls) / wall, 3),
+            "errors": len(calls) - len(ok),
+            "ttft": percentiles([c["ttft"] for c in ok if c["ttft"] is not None]),
+            "latency": percentiles([c["latency"] for c in ok]),
+            "tokens_per_second_mean": round(statistics.mean(rates), 1) if rates else None,
+            "cpu_ms_per_call": round(cpu / len(calls) * 1000, 2) if cpu is not None and calls else None,
+            "rss_kb": memory.get("VmRSS"),
+            "peak_rss_kb": memory.get("VmHWM"),
+        },
+        "calls": sorted(calls, key=lambda c: c["index"]),
+    }
+
+
+def flatten(summary: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat = {}
+    for key, value in summary.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def print_summary(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    current = flatten(results["summary"])
+    previous = flatten(baseline["summary"]) if baseline else {}
+    header = f"{'metric':<34}{'value':>12}"
+    if baseline:
+        header += f"{'baseline':>12}{'change':>10}"
+    print(header)
+    for key, value in current.items():
+        line = f"{key:<34}{str(value):>12}"
+        if baseline:
+            old = previous.get(key)
+            change = ""
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                change = f"{(value - old) / old * 100:+.1f}%"
+            line += f"{str(old):>12}{change:>10}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--prompt", default="Plan how to add a retry to the HTTP client and update its tests")
+    parser.add_argument("--same-prompt", action="store_true", help="send the identical prompt every call")
+    parser.add_argument("--cache", action="store_true", help="leave the response cache enabled")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server env")
+    parser.add_argument("--base-url", help="use an already running fake server instead of starting one")
+    parser.add_argument("--output", help="write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="results JSON from a previous run to compare against")
+    fake_groq.add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = None
+    base_url = args.base_url
+    if base_url is None:
+        port = free_port()
+        fake_args = [
+            "--port", str(port),
+            "--ttft", str(args.ttft),
+            "--token-delay", str(args.token_delay),
+            "--tokens", str(args.tokens),
+            "--think-fraction", str(args.think_fraction),
+            "--error-rate", str(args.error_rate),
+            "--rate-limit-rate", str(args.rate_limit_rate),
+            "--tpm", str(args.tpm),
+            "--seed", str(args.seed),
+        ]
+        if args.split_tags:
+            fake_args.append("--split-tags")
+        if args.replay:
+            fake_args += ["--replay", args.replay]
+        fake = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), "fake_groq.py"), *fake_args])
+        wait_for_port(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        results = asyncio.run(run(args, base_url))
+    finally:
+        if fake is not None:
+            fake.terminate()
+            fake.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_summary(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Cold start benchmark: how long an IDE waits between spawning src/server.py and the
+# MCP handshake completing, plus where import time goes.
+#
+#   uv run benchmarks/bench_startup.py --repeat 10 --output after.json
+#   uv run benchmarks/bench_startup.py --repeat 10 --compare before.json
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC = os.path.join(ROOT, "src")
+LOCAL_MODULES = {
+    os.path.splitext(name)[0] for name in os.listdir(SRC) if name.endswith(".py")
+}
+
+
+def server_env(args: argparse.Namespace) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "benchmark")
+    if args.no_key:
+        env.pop("GROQ_API_KEY")
+    # nothing listens there, the background warm-up fails fast and offline
+    env["GROQ_BASE_URL"] = args.base_url
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+async def handshake(env: Dict[str, str]) -> Dict[str, float]:
+    params = StdioServerParameters(command=sys.executable, args=[os.path.join(SRC, "server.py")], env=env)
+    start = time.perf_counter()
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            initialized = time.perf_counter()
+            await session.list_tools()
+            listed = time.perf_counter()
+    return {"initialize": initialized - start, "list_tools": listed - start}
+
+
+def import_times(env: Dict[str, str]) -> List[Dict[str, Any]]:
+    # `python -X importtime` writes "import time: self [us] | cumulative | module" to stderr
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=SRC, env=env, capture_output=True, text=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not self_us.isdigit():
+            continue  # the header line
+        modules.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return modules
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "min": round(ordered[0], 4),
+        "median": round(statistics.median(ordered), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def print_comparison(current: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    for key, stats in current.items():
+        line = f"{key:<28}" + "".join(f"{name} {value:>8.4f}s  " for name, value in stats.items())
+        old = (baseline or {}).get(key)
+        if old and old.get("median"):
+            line += f"(median {(stats['median'] - old['median']) / old['median'] * 100:+.1f}%)"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to show")
+    parser.add_argument("--base-url", default="http://127.0.0.1:9", help="GROQ_BASE_URL for the spawned server")
+    parser.add_argument("--no-key", action="store_true", help="start without GROQ_API_KEY")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server env")
+    parser.add_argument("--output", help="write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="results JSON from a previous run to compare against")
+    args = parser.parse_args()
+
+    env = server_env(args)
+    runs = [asyncio.run(handshake(env)) for _ in range(args.repeat)]
+    modules = import_times(env)
+    total = next((m["cumulative_ms"] for m in modules if m["module"] == "server"), None)
+    summary = {
+        "spawn_to_initialize": summarize([r["initialize"] for r in runs]),
+        "spawn_to_list_tools": summarize([r["list_tools"] for r in runs]),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_comparison(summary, baseline["summary"] if baseline else None)
+    if total is not None:
+        print(f"\nimport server: {total:.1f} ms")
+    print(f"\n{'slowest imports (cumulative)':<44}{'self ms':>10}{'cum ms':>10}")
+    top_level = [m for m in modules if m["module"].split(".")[0] not in LOCAL_MODULES]
+    for m in sorted(top_level, key=lambda m: -m["cumulative_ms"])[: args.top]:
+        print(f"{m['module']:<44}{m['self_ms']:>10.1f}{m['cumulative_ms']:>10.1f}")
+    print(f"\n{'local modules':<44}{'self ms':>10}{'cum ms':>10}")
+    for m in modules:
+        if m["module"] in LOCAL_MODULES:
+            print(f"{m['module']:<44}{m['self_ms']:>10.1f}{m['cumulative_ms']:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "imports": modules, "runs": runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# Microbenchmark for the per-token cost of the think stream pipeline
+# (GroqClient.reasoning_completion -> ThinkParser -> process_stream), run over
+# synthetic streams so no network or API quota is involved.
+#
+#   uv run benchmarks/bench_stream.py [--tokens 10000 50000 100000] [--output results.json]
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from groq_client import GroqClient  # noqa: E402
+from server import process_stream  # noqa: E402
+from think_parser import ThinkParser  # noqa: E402
+
+WORDS = ["the", " model", " should", " consider", " whether", " edge", " cases", ",", " and", ".\n"]
+
+
+def synthetic_tokens(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    tokens = ["<th", "ink>"]  # split open tag, like some providers emit
+    tokens += [rng.choice(WORDS) for _ in range(n)]
+    tokens += ["</", "think>", "Final", " answer"]
+    return tokens
+
+
+def as_chunks(tokens: List[str]) -> List[SimpleNamespace]:
+    # shaped like groq's ChatCompletionChunk, built up front so it isn't timed
+    return [
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=t))])
+        for t in tokens
+    ]
+
+
+class FakeStream:
+    def __init__(self, chunks: List[SimpleNamespace]):
+        self.chunks = chunks
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeCompletions:
+    def __init__(self, chunks: List[SimpleNamespace]):
+        self.chunks = chunks
+
+    async def create(self, **kwargs):
+        return FakeStream(self.chunks)
+
+
+async def legacy_pipeline(chunks: List[SimpleNamespace]) -> str:
+    # the pre-parser implementation (reasoning_completion's generator and process_stream
+    # before ThinkParser), kept as a baseline to compare against
+    async def gen(thoughts_only: bool = True):
+        in_think_block = False
+        has_processed_think_block = False
+        async for chunk in FakeStream(chunks):
+            content = chunk.choices[0].delta.content
+            if content is None:
+                continue
+            if "<think>" in content:
+                in_think_block = True
+                content = content.replace("<think>", "")
+            if "</think>" in content:
+                in_think_block = False
+                has_processed_think_block = True
+                if thoughts_only:
+                    break
+                content = content.replace("</think>", "")
+            if thoughts_only and has_processed_think_block:
+                continue
+            yield {"choices": [{"delta": {
+                "content": content if not in_think_block else "",
+                "reasoning_content": content if in_think_block else "",
+            }}]}
+
+    buffer = []
+    current_size = 0
+    output = ""
+    last_flush = 0.0
+
+    async def flush() -> None:
+        "".join(buffer)
+
+    async for chunk in gen():
+        delta = chunk.get("choices")[0].get("delta")
+        text = delta.get("content") or delta.get("reasoning_content")
+        if text:
+            buffer.append(text)
+            current_size += len(text)
+            output += text
+            now = time.monotonic()
+            if current_size >= 128 or now - last_flush >= 0.25:
+                await flush()
+                buffer = []
+                current_size = 0
+                last_flush = now
+    return output
+
+
+async def current_pipeline(chunks: List[SimpleNamespace]) -> str:
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(chunks)))
+    client = GroqClient(model="benchmark", client=fake)  # type: ignore
+    stream = await client.reasoning_completion(messages=[], thoughts_only=True)
+    return await process_stream(stream, print_output=False)
+
+
+def parser_only(tokens: List[str]) -> None:
+    parser = ThinkParser()
+    for token in tokens:
+        parser.feed(token)
+    parser.flush()
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        if asyncio.iscoroutine(result):
+            asyncio.run(result)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.tokens:
+        tokens = synthetic_tokens(n)
+        chunks = as_chunks(tokens)
+        row = {"tokens": n}
+        for name, fn, data in (
+            ("parser", parser_only, tokens),
+            ("pipeline", current_pipeline, chunks),
+            ("legacy", legacy_pipeline, chunks),
+        ):
+            seconds = best_of(args.repeat, fn, data)
+            row[f"{name}_ns_per_token"] = round(seconds / len(tokens) * 1e9, 1)
+        results.append(row)
+        print(
+            f"{n:>7} tokens  parser {row['parser_ns_per_token']:>7} ns/tok  "
+            f"pipeline {row['pipeline_ns_per_token']:>7} ns/tok  "
+            f"legacy {row['legacy_ns_per_token']:>7} ns/tok"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "stream", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Local stand-in for Groq's OpenAI-compatible streaming chat endpoint, so the server can
+# be benchmarked without API quota or network variance. Point the server at it with
+# GROQ_BASE_URL=http://127.0.0.1:<port>.
+#
+#   uv run benchmarks/fake_groq.py --port 8765 --ttft 0.3 --token-delay 0.005 --tokens 800
+#   uv run benchmarks/fake_groq.py --replay recorded_chunks.json --error-rate 0.05
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+WORDS = ["the", " user", " wants", " to", " change", " the", " parser", ",", " so", " first", " check", " tests", ".\n"]
+
+
+def synthetic_chunks(args: argparse.Namespace, rng: random.Random) -> List[str]:
+    words = [rng.choice(WORDS) for _ in range(args.tokens)]
+    think = max(0, min(len(words), int(len(words) * args.think_fraction)))
+    if args.split_tags:
+        # some providers split the tags across chunks, the parser has to cope
+        return ["<th", "ink>"] + words[:think] + ["</th", "ink>"] + words[think:]
+    return ["<think>"] + words[:think] + ["</think>"] + words[think:]
+
+
+def load_replay(path: str) -> List[str]:
+    # a JSON list of chunk strings, e.g. the delta contents captured from a real stream
+    with open(path) as f:
+        chunks = json.load(f)
+    if not isinstance(chunks, list) or not all(isinstance(c, str) for c in chunks):
+        raise ValueError(f"{path} must contain a JSON list of strings")
+    return chunks
+
+
+def create_app(args: argparse.Namespace) -> Starlette:
+    rng = random.Random(args.seed)
+    replay = load_replay(args.replay) if args.replay else None
+
+    async def chat_completions(request: Request) -> Response:
+        body = await request.json()
+        roll = rng.random()
+        if roll < args.rate_limit_rate:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": "1"},
+            )
+        if roll < args.rate_limit_rate + args.error_rate:
+            return JSONResponse(
+                {"error": {"message": "Internal server error", "type": "internal_server_error"}},
+                status_code=500,
+            )
+
+        chunks = replay if replay is not None else synthetic_chunks(args, rng)
+        model = body.get("model", "fake")
+        created = int(time.time())
+
+        async def events():
+            await asyncio.sleep(args.ttft)
+            for i, content in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(args.token_delay)
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={
+                "x-ratelimit-limit-requests": "14400",
+                "x-ratelimit-remaining-requests": "14399",
+                "x-ratelimit-reset-requests": "6s",
+                "x-ratelimit-limit-tokens": str(args.tpm),
+                "x-ratelimit-remaining-tokens": str(args.tpm),
+                "x-ratelimit-reset-tokens": "0s",
+            },
+        )
+
+    async def models(request: Request) -> Response:
+        return JSONResponse({"object": "list", "data": []})
+
+    return Starlette(
+        routes=[
+            Route("/openai/v1/chat/completions", chat_completions, methods=["POST"]),
+            Route("/openai/v1/models", models),
+        ]
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first chunk")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="seconds between chunks")
+    parser.add_argument("--tokens", type=int, default=800, help="synthetic chunks per response")
+    parser.add_argument("--think-fraction", type=float, default=0.9, help="share of chunks inside <think>")
+    parser.add_argument("--split-tags", action="store_true", help="split <think> tags across chunks")
+    parser.add_argument("--replay", help="JSON list of chunk strings to stream instead of synthetic ones")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--tpm", type=int, default=1_000_000, help="advertised tokens-per-minute limit")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
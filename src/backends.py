@@ -0,0 +1,256 @@
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from typing import Any, AsyncContextManager, AsyncIterable, AsyncIterator, Callable, Dict, List, Mapping, Optional, Tuple
+
+from metrics import CallTrace
+from scheduler import AdmissionScheduler
+from think_parser import ANSWER, REASONING, Segment, ThinkParser
+
+# skips NamedTuple's Python-level __new__, like ThinkParser does
+_segment = tuple.__new__
+
+# API key for THINK_BACKENDS entries of kind "openai" (local servers usually need none)
+OPENAI_COMPATIBLE_API_KEY = os.environ.get("OPENAI_COMPATIBLE_API_KEY") or None
+
+# 4xx statuses that are about the backend rather than the request: its key, its model
+# name or base URL, its load. Any other 4xx rejects the request itself.
+BACKEND_FAULT_STATUSES = frozenset({401, 403, 404, 408, 429})
+
+
+# The request was refused for what it is (too long, malformed), so another backend won't
+# take it either and it says nothing about this one's health
+class RequestRejected(Exception):
+    pass
+
+
+# A streaming chat completion endpoint serving a reasoning model. Subclasses open the
+# stream and pull the text deltas out of it, the think parsing and timing live here.
+class Backend(ABC):
+    def __init__(self, name: str, model: str, scheduler: Optional[AdmissionScheduler] = None):
+        self.name = name
+        self.model = model
+        self.temperature = 0
+        self.scheduler = scheduler
+
+    @abstractmethod
+    async def open(self, messages: List[Dict[str, Any]]) -> Any:
+        ...
+
+    @abstractmethod
+    def headers(self, response: Any) -> Mapping[str, str]:
+        ...
+
+    @abstractmethod
+    def chunks(self, response: Any) -> AsyncIterable[Any]:
+        # the stream's items, whatever content() takes
+        ...
+
+    def content(self, chunk: Any) -> Optional[str]:
+        # the text of one item; a plain method call, an extra generator layer here
+        # would cost more per token than the parsing does
+        return chunk
+
+    @abstractmethod
+    async def close(self, response: Any) -> None:
+        ...
+
+    def retryable_errors(self) -> Tuple[Tuple[type, ...], Tuple[type, ...]]:
+        # (HTTP status errors, connection errors) that open() raises
+        import httpx
+
+        return (httpx.HTTPStatusError,), (httpx.TransportError,)
+
+    def rejected(self, error: BaseException) -> bool:
+        status_errors, _ = self.retryable_errors()
+        if not isinstance(error, status_errors):
+            return False
+        status = error.response.status_code
+        return 400 <= status < 500 and status not in BACKEND_FAULT_STATUSES
+
+    def slot(self) -> AsyncContextManager[None]:
+        # a concurrency slot on this backend, always free without a scheduler
+        return self.scheduler.slot() if self.scheduler is not None else nullcontext()
+
+    async def warm_up(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+    async def reasoning_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        thoughts_only: bool = False,
+        cost_tokens: int = 0,
+        trace: Optional[CallTrace] = None,
+        max_reasoning_tokens: int = 0,
+        on_sent: Optional[Callable[[], None]] = None,
+    ) -> AsyncIterator[Segment]:
+        trace = trace or CallTrace(model=self.name)
+        requested = time.monotonic()
+        sent = requested
+
+        async def create():
+            nonlocal sent
+            # the last (successful) try counts as connect time, everything before it
+            # (admission, failed tries, backoff) as queue wait
+            sent = time.monotonic()
+            if on_sent is not None:
+                on_sent()
+            return await self.open(messages)
+
+        if self.scheduler is None:
+            response = await create()
+        else:
+            status_errors, connection_errors = self.retryable_errors()
+            response = await self.scheduler.call(create, cost_tokens, status_errors, connection_errors)
+            self.scheduler.observe(self.headers(response))
+        trace.queue_wait += sent - requested
+        trace.connect = time.monotonic() - sent
+        try:
+            async def response_generator():
+                parser = ThinkParser()
+                feed = parser.feed
+                content_of = self.content
+                # no limit is the same as one that's never reached
+                limit = max_reasoning_tokens or float("inf")
+                try:
+                    async for chunk in self.chunks(response):
+                        content = content_of(chunk)
+                        if not content:
+                            continue
+                        in_think = parser.in_think
+                        if in_think:
+                            if trace.reasoning_tokens >= limit:
+                                trace.truncated = "max_reasoning_tokens"
+                                trace.think_end_at = time.monotonic()
+                                return
+                            trace.reasoning_tokens += 1
+                        elif trace.first_token_at is None:
+                            trace.first_token_at = time.monotonic()
+
+                        # fast path for the vast majority of chunks, which can't hold or
+                        # finish a tag: the parser would pass them through unchanged
+                        if "<" not in content and not parser.pending:
+                            yield _segment(Segment, (REASONING if in_think else ANSWER, content))
+                            continue
+                        segments = feed(content)
+                        if parser.think_closed:
+                            if trace.think_end_at is None:
+                                trace.think_end_at = time.monotonic()
+                            # everything after the think block is the answer, which we don't
+                            # need, including what came in the chunk that closed it
+                            if thoughts_only:
+                                while segments and segments[-1].kind == ANSWER:
+                                    segments.pop()
+                                for segment in segments:
+                                    yield segment
+                                return
+                        for segment in segments:
+                            yield segment
+
+                    for segment in parser.flush():
+                        yield segment
+                    if trace.think_end_at is None:
+                        trace.think_end_at = time.monotonic()
+                finally:
+                    # stop upstream generation (and free the connection) as soon as we stop
+                    # reading, whether we're done, cancelled or lost a hedged race
+                    await self.close(response)
+
+            return response_generator()
+
+        except ValueError as e:
+            raise e  # Re-raise validation errors
+        except Exception as e:
+            raise Exception(f"Error in chat completion: {str(e)}")
+
+
+# Any server speaking OpenAI's streaming /chat/completions, e.g. llama.cpp's llama-server
+# or vLLM. Talks plain httpx so it doesn't need an SDK.
+class OpenAICompatibleClient(Backend):
+    def __init__(
+        self,
+        model: str,
+        base_url: str,
+        api_key: Optional[str] = OPENAI_COMPATIBLE_API_KEY,
+        scheduler: Optional[AdmissionScheduler] = None,
+        timeout: float = 600,
+    ):
+        super().__init__(f"openai:{model}@{base_url}", model, scheduler)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self._http = None
+
+    @property
+    def http(self):
+        if self._http is None:
+            import httpx
+
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url, headers=headers, timeout=httpx.Timeout(self.timeout, connect=10)
+            )
+        return self._http
+
+    async def open(self, messages: List[Dict[str, Any]]) -> Any:
+        request = self.http.build_request(
+            "POST",
+            "/chat/completions",
+            json={
+                "model": self.model,
+                "messages": messages,
+                "temperature": self.temperature,
+                "stream": True,
+            },
+        )
+        response = await self.http.send(request, stream=True)
+        if response.status_code >= 400:
+            # read the error body so raise_for_status can report it, the scheduler
+            # retries 429s and 5xx like it does for Groq
+            await response.aread()
+            await response.aclose()
+            response.raise_for_status()
+        return response
+
+    def headers(self, response: Any) -> Mapping[str, str]:
+        return response.headers
+
+    async def chunks(self, response: Any) -> AsyncIterator[str]:
+        # servers that parse reasoning out of the text (vLLM's reasoning parsers,
+        # llama-server --reasoning-format) send it as reasoning_content; put the
+        # tags back so it goes through the same parser as Groq's inline <think>
+        reasoning = False
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices")
+            if not choices:
+                continue
+            delta = choices[0].get("delta") or {}
+            thought = delta.get("reasoning_content") or delta.get("reasoning")
+            if thought:
+                yield thought if reasoning else "<think>" + thought
+                reasoning = True
+            content = delta.get("content")
+            if content:
+                yield "</think>" + content if reasoning else content
+                reasoning = False
+
+    async def close(self, response: Any) -> None:
+        await response.aclose()
+
+    async def warm_up(self) -> None:
+        # opens a keep-alive connection, most servers answer /models cheaply
+        await self.http.get("/models")
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
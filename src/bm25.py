@@ -0,0 +1,45 @@
+import math
+import re
+from collections import Counter
+from typing import List
+
+_TERM = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in into is it its "
+    "me my not of on or so that the their them then there these this to was we what "
+    "when which will with you your".split()
+)
+
+
+def terms(text: str) -> List[str]:
+    # snake_case names split into words, so "read file" matches read_file
+    return [t for t in _TERM.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+# Okapi BM25 over a fixed set of documents, small enough to rebuild whenever they change
+class BM25:
+    def __init__(self, documents: List[List[str]], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_freqs = [Counter(doc) for doc in documents]
+        self.doc_lens = [len(doc) for doc in documents]
+        self.avg_len = sum(self.doc_lens) / len(documents) if documents else 0.0
+        df: Counter = Counter()
+        for freqs in self.doc_freqs:
+            df.update(freqs.keys())
+        n = len(documents)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, query: List[str]) -> List[float]:
+        query = [t for t in set(query) if t in self.idf]
+        scores = []
+        for freqs, length in zip(self.doc_freqs, self.doc_lens):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_len) if self.avg_len else self.k1
+            score = 0.0
+            for t in query:
+                f = freqs.get(t)
+                if f:
+                    score += self.idf[t] * f * (self.k1 + 1) / (f + norm)
+            scores.append(score)
+        return scores
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+THINK_CACHE = os.environ.get("THINK_CACHE", "1") != "0"
+THINK_CACHE_PATH = os.environ.get(
+    "THINK_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "chain-of-thought-mcp", "cache.sqlite3"),
+)
+THINK_CACHE_MEMORY_SIZE = int(os.environ.get("THINK_CACHE_MEMORY_SIZE", "256"))
+THINK_CACHE_TTL = float(os.environ.get("THINK_CACHE_TTL", str(7 * 24 * 3600)))
+THINK_CACHE_MAX_ENTRIES = int(os.environ.get("THINK_CACHE_MAX_ENTRIES", "10000"))
+# seconds between sweeps of expired and least recently used rows out of the SQLite tier
+THINK_CACHE_EVICT_INTERVAL = float(os.environ.get("THINK_CACHE_EVICT_INTERVAL", "60"))
+
+
+def cache_key(prompt: str, model: str, system_prompt: str) -> str:
+    # whitespace-only differences in the prompt shouldn't miss the cache, and hashing the
+    # system prompt means editing it invalidates every old entry
+    normalized = " ".join(prompt.split())
+    digest = hashlib.sha256()
+    for part in (normalized, model, system_prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# The memory tier is used inline. SQLite runs on a single thread of its own, in order:
+# a locked database (WAL is shared by every server process) can block for up to
+# sqlite3's busy timeout, which must not stall the event loop and every session with it.
+class ResponseCache:
+    def __init__(
+        self,
+        path: Optional[str] = THINK_CACHE_PATH,
+        memory_size: int = THINK_CACHE_MEMORY_SIZE,
+        ttl: float = THINK_CACHE_TTL,
+        max_entries: int = THINK_CACHE_MAX_ENTRIES,
+        evict_interval: float = THINK_CACHE_EVICT_INTERVAL,
+    ):
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self._evicted_at = 0.0
+        # key -> (created_at, value), most recently used last
+        self.memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.db: Optional[sqlite3.Connection] = None
+        self._disk: Optional[ThreadPoolExecutor] = None
+        if path:
+            self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache")
+            self._submit(self._open, path)
+
+    def _open(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets several server processes share one cache file
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self.memory.get(key)
+        if entry is not None:
+            created_at, value = entry
+            if now - created_at < self.ttl:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            del self.memory[key]
+
+        if self._disk is not None:
+            try:
+                row = await asyncio.wrap_future(self._submit(self._disk_get, key, now))
+            except sqlite3.Error:
+                # already logged, e.g. the database stayed locked: a miss, not a failed call
+                row = None
+            if row is not None:
+                value, created_at = row
+                self._remember(key, created_at, value)
+                self.disk_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        # doesn't wait for the disk write, the memory tier already has it
+        now = time.time()
+        self._remember(key, now, value)
+        if self._disk is not None:
+            self._submit(self._disk_set, key, value, now)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+        }
+
+    def close(self) -> None:
+        if self._disk is not None:
+            # finishes the writes still queued
+            self._disk.shutdown(wait=True)
+            self._disk = None
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> "Future":
+        assert self._disk is not None
+        future = self._disk.submit(fn, *args)
+        future.add_done_callback(self._log_error)
+        return future
+
+    @staticmethod
+    def _log_error(future: "Future") -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Response cache disk tier: {future.exception()!r}")
+
+    # the _disk_* methods and _evict run on the cache thread
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        if self.db is None:
+            return None
+        row = self.db.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] >= self.ttl:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row
+
+    def _disk_set(self, key: str, value: str, now: float) -> None:
+        if self.db is None:
+            return
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, value, now, now),
+        )
+        # the LRU sweep sorts the whole table, once in a while is enough
+        if now - self._evicted_at >= self.evict_interval:
+            self._evicted_at = now
+            self._evict(now)
+
+    def _remember(self, key: str, created_at: float, value: str) -> None:
+        self.memory[key] = (created_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def _evict(self, now: float) -> None:
+        assert self.db is not None
+        self.db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        # keep only the max_entries most recently used rows
+        self.db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
@@ -0,0 +1,160 @@
+import os
+import re
+from typing import List, NamedTuple, Optional, Set
+
+from bm25 import BM25, terms
+from prompt_budget import count_tokens
+from session_memory import tail
+
+# What chain_of_thought hands back to the calling agent, where every returned token stays
+# in its context: full, dedup (repeated sentences dropped) or condensed (dedup, then cut
+# to THINK_OUTPUT_MAX_TOKENS keeping the conclusions). Thoughts are cached in full.
+THINK_OUTPUT_MODE = os.environ.get("THINK_OUTPUT_MODE", "full")
+# estimated tokens a condensed result is cut down to
+THINK_OUTPUT_MAX_TOKENS = int(os.environ.get("THINK_OUTPUT_MAX_TOKENS", "800"))
+# a sentence is a repeat when this share of its word 4-grams appeared earlier
+THINK_OUTPUT_DEDUP_OVERLAP = float(os.environ.get("THINK_OUTPUT_DEDUP_OVERLAP", "0.8"))
+
+MODES = ("full", "dedup", "condensed")
+COMPACTED = "\n\n[{label} from ~{before} to ~{after} tokens, {ratio:.2f}x compression]"
+GAP = "[...] "
+
+# sentence ends, or line breaks with the blank lines around them
+_BOUNDARY = re.compile(r"((?<=[.!?])[ \t]+|[ \t]*\n\s*)")
+_WORD = re.compile(r"\w+")
+# numbered or bulleted lines, usually the steps of the plan
+_LIST_ITEM = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s")
+SHINGLE = 4
+
+
+class Sentence(NamedTuple):
+    text: str
+    # whitespace that followed it, so paragraphs and lists survive
+    separator: str
+    tokens: int
+
+
+class OutputShape(NamedTuple):
+    mode: str = THINK_OUTPUT_MODE
+    max_tokens: int = THINK_OUTPUT_MAX_TOKENS
+
+    @classmethod
+    def resolve(cls, mode: Optional[str] = None, max_tokens: Optional[int] = None) -> "OutputShape":
+        defaults = cls()
+        shape = cls(mode or defaults.mode, max_tokens if max_tokens and max_tokens > 0 else defaults.max_tokens)
+        if shape.mode not in MODES:
+            raise ValueError(f"Unknown output mode {shape.mode!r}, expected one of {', '.join(MODES)}")
+        return shape
+
+
+# Drops repeated sentences while the reasoning streams in (fed the same flushes as the
+# client), so only the last sentence and the budget cut are left for when it ends.
+class Condenser:
+    def __init__(self, shape: OutputShape, overlap: float = THINK_OUTPUT_DEDUP_OVERLAP):
+        self.shape = shape
+        self.overlap = overlap
+        self.before = 0
+        self.after = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self.fed: List[str] = []
+        self.pending = ""
+        self.sentences: List[Sentence] = []
+        self.seen: Set[int] = set()
+        self.in_code = False
+        self.tokens = 0
+
+    def feed(self, text: str) -> None:
+        self.fed.append(text)
+        parts = _BOUNDARY.split(self.pending + text)
+        # the last part may be a sentence that's still being written
+        self.pending = parts[-1]
+        for i in range(0, len(parts) - 1, 2):
+            self._add(parts[i], parts[i + 1])
+
+    def _add(self, text: str, separator: str) -> None:
+        tokens = count_tokens(text)
+        self.tokens += tokens
+        if text.lstrip().startswith("```"):
+            self.in_code = not self.in_code
+        words = _WORD.findall(text.lower())
+        # code is kept verbatim, a repeated "}" is not a repeated thought
+        if words and not self.in_code:
+            shingles = {
+                hash(tuple(words[i:i + SHINGLE])) for i in range(max(1, len(words) - SHINGLE + 1))
+            }
+            if len(shingles & self.seen) >= self.overlap * len(shingles):
+                if "\n" in separator and self.sentences and "\n" not in self.sentences[-1].separator:
+                    # don't glue the next paragraph onto this one
+                    self.sentences[-1] = self.sentences[-1]._replace(separator=separator)
+                return
+            self.seen |= shingles
+        if text or self.sentences:
+            self.sentences.append(Sentence(text, separator, tokens))
+
+    def shape_text(self, response: str, prompt: str) -> str:
+        # what was streamed is normally the start of the response, unless the leading
+        # attempt failed and another one's text was returned
+        fed = "".join(self.fed)
+        if not response.startswith(fed):
+            self._reset()
+            fed = ""
+        self.feed(response[len(fed):])
+        if self.pending:
+            self._add(self.pending, "")
+            self.pending = ""
+        if self.shape.mode == "condensed":
+            kept = self._condense(prompt)
+        else:
+            kept = self.sentences
+        text = "".join(s.text + s.separator for s in kept).strip()
+        self.before, self.after = self.tokens, count_tokens(text)
+        if self.after >= self.before:
+            return response
+        label = "Condensed" if self.shape.mode == "condensed" else "Deduplicated"
+        return text + COMPACTED.format(
+            label=label, before=self.before, after=self.after, ratio=self.before / max(self.after, 1)
+        )
+
+    def _condense(self, prompt: str) -> List[Sentence]:
+        sentences = self.sentences
+        budget = self.shape.max_tokens
+        if sum(s.tokens for s in sentences) <= budget:
+            return sentences
+        # the conclusions and final plan are at the end: whole sentences from the end,
+        # up to half the budget
+        keep = set()
+        conclusion_budget = budget // 2
+        last = len(sentences) - 1
+        while last >= 0 and sentences[last].tokens <= conclusion_budget:
+            keep.add(last)
+            conclusion_budget -= sentences[last].tokens
+            budget -= sentences[last].tokens
+            last -= 1
+        if not keep:
+            return [Sentence(tail(sentences[-1].text, budget), "", budget)]
+        # the rest goes to the earlier sentences most relevant to the prompt and the
+        # conclusions, plan steps first
+        earlier = sentences[: last + 1]
+        if earlier:
+            conclusions = " ".join(sentences[i].text for i in keep)
+            scores = BM25([terms(s.text) for s in earlier]).scores(terms(prompt + " " + conclusions))
+            for i, s in enumerate(earlier):
+                if _LIST_ITEM.match(s.text):
+                    scores[i] *= 1.5
+            # each pick may open a gap, whose marker counts too
+            gap_tokens = count_tokens(GAP)
+            for i in sorted(range(len(earlier)), key=lambda i: -scores[i]):
+                if scores[i] <= 0:
+                    break
+                if earlier[i].tokens + gap_tokens <= budget:
+                    keep.add(i)
+                    budget -= earlier[i].tokens + gap_tokens
+        kept = []
+        for i in sorted(keep):
+            sentence = sentences[i]
+            if i > 0 and i - 1 not in keep:
+                sentence = sentence._replace(text=GAP + sentence.text)
+            kept.append(sentence)
+        return kept
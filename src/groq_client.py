@@ -1,74 +1,133 @@
 import os
-from groq import AsyncGroq
-from typing import List, Dict, Any
+import threading
+from typing import TYPE_CHECKING, AsyncIterable, List, Dict, Any, Mapping, Optional, Tuple
+from backends import Backend
+from scheduler import AdmissionScheduler
 from dotenv import load_dotenv
 
+# the groq SDK takes ~0.4s to import, it's loaded on first use (or by the background
+# warm-up) so the MCP handshake doesn't wait for it
+if TYPE_CHECKING:
+    from groq import AsyncGroq
+
 load_dotenv()
 
+# checked when a client is built: a missing key is reported as a tool error instead of
+# the server dying before the client ever sees it
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY is not set")
-
-class GroqClient:
-    def __init__(self, model: str):
-        self.model = model
-        self.temperature = 0
-        # pass in api key to the client
-        self.client = AsyncGroq(
-            api_key=GROQ_API_KEY,
+
+# Point the client at another OpenAI-compatible endpoint, e.g. benchmarks/fake_groq.py
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL") or None
+
+# Connection pool settings, shared by every think call in the process
+GROQ_MAX_CONNECTIONS = int(os.environ.get("GROQ_MAX_CONNECTIONS", "20"))
+GROQ_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("GROQ_MAX_KEEPALIVE_CONNECTIONS", "10"))
+GROQ_KEEPALIVE_EXPIRY = float(os.environ.get("GROQ_KEEPALIVE_EXPIRY", "300"))
+GROQ_WARM_UP = os.environ.get("GROQ_WARM_UP", "1") != "0"
+
+
+def _api_key() -> str:
+    if not GROQ_API_KEY:
+        raise ValueError("GROQ_API_KEY is not set, add it to the server's env or .env file")
+    return GROQ_API_KEY
+
+
+class GroqPool:
+    def __init__(
+        self,
+        max_connections: int = GROQ_MAX_CONNECTIONS,
+        max_keepalive_connections: int = GROQ_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = GROQ_KEEPALIVE_EXPIRY,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._client: Optional["AsyncGroq"] = None
+        # the warm-up builds the client in a thread, possibly while the first call does too
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> "AsyncGroq":
+        # one AsyncGroq (and one httpx pool) per process, so keep-alive connections
+        # are reused across calls instead of paying TCP/TLS setup every time
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._build()
+        return self._client
+
+    def _build(self) -> "AsyncGroq":
+        import httpx
+        from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+        return AsyncGroq(
+            api_key=_api_key(),
+            base_url=GROQ_BASE_URL,
+            # retries (429/5xx with backoff) are done by the AdmissionScheduler
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            ),
         )
 
-    async def reasoning_completion(
+    async def warm_up(self) -> None:
+        # cheap authenticated request that leaves an open connection in the pool
+        await self.client.models.list()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+
+
+class GroqClient(Backend):
+    def __init__(
         self,
-        messages: List[Dict[str, Any]],
-        thoughts_only: bool = False,
+        model: str,
+        client: Optional["AsyncGroq"] = None,
+        scheduler: Optional[AdmissionScheduler] = None,
+        pool: Optional[GroqPool] = None,
     ):
-        response = await self.client.chat.completions.create(
+        super().__init__(f"groq:{model}", model, scheduler)
+        self._client = client
+        self.pool = pool
+
+    @property
+    def client(self) -> "AsyncGroq":
+        # reuse the pooled client when given, otherwise fall back to a private one
+        if self._client is None:
+            if self.pool is not None:
+                self._client = self.pool.client
+            else:
+                from groq import AsyncGroq
+
+                self._client = AsyncGroq(api_key=_api_key(), base_url=GROQ_BASE_URL)
+        return self._client
+
+    async def open(self, messages: List[Dict[str, Any]]) -> Any:
+        return await self.client.chat.completions.create(
             model=self.model,
             messages=messages,
             temperature=self.temperature,
             stream=True,
         )
-        try:
-            async def response_generator():
-                in_think_block = False
-                has_processed_think_block = False
-                async for chunk in response:
-                    content = chunk.choices[0].delta.content  # type: ignore
-                    if content is None:
-                        continue
-
-                    # Check for think tags
-                    if "<think>" in content:
-                        in_think_block = True
-                        content = content.replace("<think>", "")
-                    if "</think>" in content:
-                        in_think_block = False
-                        has_processed_think_block = True
-                        if thoughts_only:
-                            break
-                        content = content.replace("</think>", "")
-
-                    # If thoughts_only and we're not in a think block, skip
-                    if thoughts_only and has_processed_think_block:
-                        continue
-
-                    yield {
-                        "choices": [
-                            {
-                                "delta": {
-                                    "content": content if not in_think_block else "",
-                                    "reasoning_content": (
-                                        content if in_think_block else ""
-                                    ),
-                                }
-                            }
-                        ],
-                    }
-
-            return response_generator()
-
-        except ValueError as e:
-            raise e  # Re-raise validation errors
-        except Exception as e:
-            raise Exception(f"Error in chat completion: {str(e)}")
+
+    def headers(self, response: Any) -> Mapping[str, str]:
+        return response.response.headers
+
+    def retryable_errors(self) -> Tuple[Tuple[type, ...], Tuple[type, ...]]:
+        import groq
+
+        return (groq.APIStatusError,), (groq.APIConnectionError,)
+
+    def chunks(self, response: Any) -> AsyncIterable[Any]:
+        return response
+
+    def content(self, chunk: Any) -> Optional[str]:
+        return chunk.choices[0].delta.content
+
+    async def close(self, response: Any) -> None:
+        await response.close()
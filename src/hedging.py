@@ -0,0 +1,110 @@
+import asyncio
+import os
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple, TypeVar
+
+# Send a backup request to the secondary model when the primary is slow to start
+THINK_HEDGE = os.environ.get("THINK_HEDGE", "0") != "0"
+# seconds without a first token before hedging, or "p95" to use the observed p95 TTFT
+THINK_HEDGE_DELAY = os.environ.get("THINK_HEDGE_DELAY", "p95")
+# delay used with "p95" until enough TTFTs have been observed
+THINK_HEDGE_DEFAULT_DELAY = float(os.environ.get("THINK_HEDGE_DEFAULT_DELAY", "2.0"))
+
+T = TypeVar("T")
+
+# an attempt sets the event when its first token arrives
+Attempt = Callable[[asyncio.Event], Awaitable[T]]
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def hedge_delay(ttft: LatencyWindow) -> float:
+    if THINK_HEDGE_DELAY == "p95":
+        p95 = ttft.percentile(0.95)
+        return THINK_HEDGE_DEFAULT_DELAY if p95 is None else p95
+    return float(THINK_HEDGE_DELAY)
+
+
+async def _cancel(tasks: List["asyncio.Task[T]"]) -> None:
+    for task in tasks:
+        task.cancel()
+    # wait for them so the losers' upstream streams are actually closed
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Run attempts[0] and start the next attempt whenever no first token has arrived within
+# `delay` (or everything running has failed; with delay=None only then). Returns
+# (index, result) of the first attempt to finish successfully and cancels the others.
+# An attempt raising one of `fatal` ends the race with that error, nothing else is tried.
+async def race(
+    attempts: List[Attempt], delay: Optional[float], fatal: Tuple[type, ...] = ()
+) -> Tuple[int, T]:
+    tasks: List["asyncio.Task[T]"] = []
+    started: List[asyncio.Event] = []
+
+    def launch() -> None:
+        event = asyncio.Event()
+        started.append(event)
+        tasks.append(asyncio.ensure_future(attempts[len(tasks)](event)))
+
+    launch()
+    error: Optional[BaseException] = None
+    try:
+        while True:
+            pending = [t for t in tasks if not t.done()]
+            # a failed attempt's first token doesn't count, its backup is still needed
+            can_hedge = len(tasks) < len(attempts) and not any(
+                e.is_set() for e, t in zip(started, tasks) if not t.done()
+            )
+            if not pending:
+                if not can_hedge:
+                    assert error is not None
+                    raise error
+                launch()
+                continue
+
+            waiters = set(pending)
+            first_tokens = []
+            if can_hedge:
+                first_tokens = [
+                    asyncio.ensure_future(e.wait())
+                    for e, t in zip(started, tasks)
+                    if not t.done()
+                ]
+                waiters.update(first_tokens)
+            try:
+                done, _ = await asyncio.wait(
+                    waiters,
+                    timeout=delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                # also when the race itself is cancelled, or they're left pending forever
+                for waiter in first_tokens:
+                    waiter.cancel()
+
+            for task in tasks:
+                if task in done:
+                    if task.exception() is None:
+                        return tasks.index(task), task.result()
+                    error = task.exception()
+                    if isinstance(error, fatal):
+                        raise error
+            if can_hedge and not done:
+                # no first token within the delay, send the backup request
+                launch()
+    finally:
+        await _cancel([t for t in tasks if not t.done()])
@@ -0,0 +1,39 @@
+import os
+from typing import NamedTuple, Optional
+
+# Server-wide limits for a chain_of_thought call, 0 disables a limit. A per-call value
+# replaces the default but can't exceed it.
+THINK_MAX_REASONING_TOKENS = int(os.environ.get("THINK_MAX_REASONING_TOKENS", "0"))
+# seconds from the call starting until whatever has been reasoned so far is returned
+THINK_DEADLINE = float(os.environ.get("THINK_DEADLINE", "120"))
+# seconds to wait for the first reasoning token, from when the request is sent, before
+# giving up on a backend and trying the next one
+THINK_TTFT_TIMEOUT = float(os.environ.get("THINK_TTFT_TIMEOUT", "30"))
+
+TRUNCATED = "\n\n[Reasoning truncated: {reason}]"
+
+
+def _tighter(default: float, requested: Optional[float]) -> float:
+    if requested is None or requested <= 0:
+        return default
+    return min(default, requested) if default > 0 else requested
+
+
+class Limits(NamedTuple):
+    max_reasoning_tokens: int = THINK_MAX_REASONING_TOKENS
+    deadline: float = THINK_DEADLINE
+    ttft_timeout: float = THINK_TTFT_TIMEOUT
+
+    @classmethod
+    def resolve(
+        cls,
+        max_reasoning_tokens: Optional[int] = None,
+        deadline: Optional[float] = None,
+        ttft_timeout: Optional[float] = None,
+    ) -> "Limits":
+        defaults = cls()
+        return cls(
+            int(_tighter(defaults.max_reasoning_tokens, max_reasoning_tokens)),
+            _tighter(defaults.deadline, deadline),
+            _tighter(defaults.ttft_timeout, ttft_timeout),
+        )
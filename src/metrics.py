@@ -0,0 +1,222 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, IO, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Per-call instrumentation. Never written to stdout, that's the stdio MCP transport.
+# Append one JSON line per chain_of_thought call to this file (unset: no traces)
+THINK_TRACE_PATH = os.environ.get("THINK_TRACE_PATH") or None
+# Serve OpenMetrics on http://THINK_METRICS_HOST:THINK_METRICS_PORT/metrics (unset: off)
+THINK_METRICS_PORT = int(os.environ.get("THINK_METRICS_PORT") or 0)
+THINK_METRICS_HOST = os.environ.get("THINK_METRICS_HOST", "127.0.0.1")
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RATE_BUCKETS = (10, 25, 50, 100, 200, 400, 800, 1600)
+RATIO_BUCKETS = (1, 1.25, 1.5, 2, 3, 5, 10, 20)
+
+
+@dataclass
+class CallTrace:
+    # times are time.monotonic() readings, durations are derived in as_dict()
+    started: float = field(default_factory=time.monotonic)
+    model: Optional[str] = None
+    # content hash of the compiled system prompt the call used
+    prompt: Optional[str] = None
+    # hit, miss, shared (joined an identical in-flight call) or off
+    cache: str = "miss"
+    hedged: bool = False
+    # waiting for a concurrency slot, rate limit admission and retry backoff
+    queue_wait: float = 0.0
+    # request sent until response headers, of the request that succeeded
+    connect: Optional[float] = None
+    first_token_at: Optional[float] = None
+    think_end_at: Optional[float] = None
+    # streamed chunks inside <think>, Groq sends one token per chunk
+    reasoning_tokens: int = 0
+    # the limit that cut reasoning short, if any
+    truncated: Optional[str] = None
+    # estimated tokens of the thoughts and of what was returned, when they were compacted
+    thought_tokens: Optional[int] = None
+    returned_tokens: Optional[int] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+
+    def absorb(self, attempt: "CallTrace") -> None:
+        # take the upstream timings of the attempt whose result was returned
+        self.model = attempt.model
+        self.queue_wait += attempt.queue_wait
+        self.connect = attempt.connect
+        self.first_token_at = attempt.first_token_at
+        self.think_end_at = attempt.think_end_at
+        self.reasoning_tokens = attempt.reasoning_tokens
+        self.truncated = self.truncated or attempt.truncated
+
+    def as_dict(self) -> Dict[str, Any]:
+        def since(start: Optional[float], end: Optional[float]) -> Optional[float]:
+            return round(end - start, 6) if start is not None and end is not None else None
+
+        think = since(self.first_token_at, self.think_end_at)
+        return {
+            "timestamp": time.time() - (time.monotonic() - self.started),
+            "model": self.model,
+            "prompt": self.prompt,
+            "cache": self.cache,
+            "hedged": self.hedged,
+            "queue_wait": round(self.queue_wait, 6),
+            "connect": None if self.connect is None else round(self.connect, 6),
+            "ttft": since(self.started, self.first_token_at),
+            "think": think,
+            "reasoning_tokens": self.reasoning_tokens,
+            "tokens_per_second": round(self.reasoning_tokens / think, 1) if think else None,
+            "latency": since(self.started, self.finished),
+            "truncated": self.truncated,
+            "compression": (
+                round(self.thought_tokens / max(self.returned_tokens, 1), 2)
+                if self.thought_tokens is not None and self.returned_tokens is not None
+                else None
+            ),
+            "error": self.error,
+        }
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # label set -> [count per bucket..., +Inf count, sum]
+        self._series: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+
+    def observe(self, value: Optional[float], **labels: str) -> None:
+        if value is None:
+            return
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# TYPE {self.name} histogram", f"# HELP {self.name} {self.help}"]
+        for key, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(key + (("le", _format_value(float(bound))),))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Tuple[Tuple[str, str], ...], int] = {}
+
+    def inc(self, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + 1
+
+    def render(self) -> List[str]:
+        lines = [f"# TYPE {self.name} counter", f"# HELP {self.name} {self.help}"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}_total{_format_labels(key)} {value}")
+        return lines
+
+
+class Metrics:
+    def __init__(self, trace_path: Optional[str] = THINK_TRACE_PATH):
+        self.calls = Counter("think_calls", "chain_of_thought calls by model, system prompt, cache status and error")
+        self.histograms = {
+            "queue_wait": Histogram("think_queue_wait_seconds", "Time waiting for admission", SECONDS_BUCKETS),
+            "connect": Histogram("think_connect_seconds", "Request sent until response headers", SECONDS_BUCKETS),
+            "ttft": Histogram("think_ttft_seconds", "Call start until the first streamed token", SECONDS_BUCKETS),
+            "think": Histogram("think_reasoning_seconds", "Time spent inside the think block", SECONDS_BUCKETS),
+            "reasoning_tokens": Histogram("think_reasoning_tokens", "Tokens inside the think block", TOKEN_BUCKETS),
+            "tokens_per_second": Histogram("think_tokens_per_second", "Reasoning tokens per second", RATE_BUCKETS),
+            "latency": Histogram("think_latency_seconds", "Total chain_of_thought latency", SECONDS_BUCKETS),
+            "compression": Histogram("think_compression_ratio", "Thought tokens per returned token", RATIO_BUCKETS),
+        }
+        self._trace_file: Optional[IO[str]] = None
+        if trace_path:
+            os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+            # line buffered: each trace is on disk as soon as its call ends
+            self._trace_file = open(trace_path, "a", buffering=1)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def record(self, trace: CallTrace) -> None:
+        if trace.finished is None:
+            trace.finished = time.monotonic()
+        record = trace.as_dict()
+        # per prompt hash too, so a reloaded prompt can be compared with the one before
+        labels = {"model": trace.model or "none", "prompt": trace.prompt or "none"}
+        self.calls.inc(cache=trace.cache, error=trace.error or "none", **labels)
+        for name, histogram in self.histograms.items():
+            histogram.observe(record[name], **labels)
+        if self._trace_file is not None:
+            self._trace_file.write(json.dumps(record) + "\n")
+        logger.debug(f"chain_of_thought trace: {record}")
+
+    def render(self) -> str:
+        lines = self.calls.render()
+        for histogram in self.histograms.values():
+            lines.extend(histogram.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str = THINK_METRICS_HOST, port: int = THINK_METRICS_PORT) -> None:
+        # just enough HTTP for a Prometheus scrape, not worth a web framework in stdio mode
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                request = await reader.readuntil(b"\r\n\r\n")
+                path = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+                if path.split(b"?")[0] == b"/metrics":
+                    status, body = "200 OK", self.render().encode()
+                else:
+                    status, body = "404 Not Found", b"not found\n"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: application/openmetrics-text; version=1.0.0; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        self._server = await asyncio.start_server(handle, host, port)
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
@@ -0,0 +1,99 @@
+import json
+import os
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+from bm25 import BM25, terms
+
+# Only send the tool schemas / rule blocks relevant to the prompt, within a token budget
+THINK_PROMPT_SELECT = os.environ.get("THINK_PROMPT_SELECT", "1") != "0"
+THINK_PROMPT_MAX_TOKENS = int(os.environ.get("THINK_PROMPT_MAX_TOKENS", "6000"))
+# sections scoring below this fraction of the best match are treated as irrelevant
+THINK_PROMPT_MIN_RELEVANCE = float(os.environ.get("THINK_PROMPT_MIN_RELEVANCE", "0.25"))
+
+# Groq doesn't expose the models' tokenizers, so this is a word/punctuation estimate.
+# It tracks BPE counts closely enough on English and JSON to budget with.
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# one <function>{...}</function> line, or a <Capitalized_Rule> ... </Capitalized_Rule> block.
+# Everything between them (headers, wrapper tags, overview) is always sent.
+_OPTIONAL_SECTION = re.compile(
+    r"^<function>(?P<schema>.*?)</function>\n|^<(?P<rule>[A-Z]\w*)>[ \t]*\n.*?^</(?P=rule)>[ \t]*\n",
+    re.MULTILINE | re.DOTALL,
+)
+
+
+def count_tokens(text: str) -> int:
+    return len(_TOKEN.findall(text))
+
+
+class Section(NamedTuple):
+    name: str
+    text: str
+    tokens: int
+    required: bool
+
+
+def split_sections(system_prompt: str) -> List[Section]:
+    sections = []
+    pos = 0
+    for match in _OPTIONAL_SECTION.finditer(system_prompt):
+        if match.start() > pos:
+            text = system_prompt[pos:match.start()]
+            sections.append(Section(f"text:{len(sections)}", text, count_tokens(text), True))
+        text = match.group(0)
+        if match.group("rule"):
+            name = f"rule:{match.group('rule')}"
+        else:
+            try:
+                # strict=False: the schemas contain literal newlines inside strings
+                name = f"tool:{json.loads(match.group('schema'), strict=False)['name']}"
+            except (ValueError, KeyError):
+                name = f"tool:{len(sections)}"
+        sections.append(Section(name, text, count_tokens(text), False))
+        pos = match.end()
+    if pos < len(system_prompt):
+        text = system_prompt[pos:]
+        sections.append(Section(f"text:{len(sections)}", text, count_tokens(text), True))
+    return sections
+
+
+class PromptBudget:
+    def __init__(self, system_prompt: str):
+        self.sections = split_sections(system_prompt)
+        self.optional = [i for i, s in enumerate(self.sections) if not s.required]
+        self.required_tokens = sum(s.tokens for s in self.sections if s.required)
+        self.total_tokens = sum(s.tokens for s in self.sections)
+        self.index = BM25([terms(self.sections[i].text) for i in self.optional])
+
+    def report(self) -> List[Tuple[str, int]]:
+        return [(s.name, s.tokens) for s in self.sections if s.tokens]
+
+    def assemble(
+        self,
+        prompt: str,
+        max_tokens: int = THINK_PROMPT_MAX_TOKENS,
+        min_relevance: float = THINK_PROMPT_MIN_RELEVANCE,
+    ) -> str:
+        budget = max_tokens - self.required_tokens - count_tokens(prompt)
+        ranked = sorted(
+            zip(self.index.scores(terms(prompt)), self.optional), key=lambda x: -x[0]
+        )
+        threshold = ranked[0][0] * min_relevance if ranked else 0.0
+        included = set()
+        for score, i in ranked:
+            if score <= 0 or score < threshold:
+                break
+            if self.sections[i].tokens <= budget:
+                included.add(i)
+                budget -= self.sections[i].tokens
+        # keep the original section order so the prompt still reads as written
+        return "".join(
+            s.text for i, s in enumerate(self.sections) if s.required or i in included
+        )
+
+
+@lru_cache(maxsize=8)
+def prompt_budget(system_prompt: str) -> PromptBudget:
+    # sections are split and counted once per distinct system prompt
+    return PromptBudget(system_prompt)
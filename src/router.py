@@ -0,0 +1,168 @@
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+from backends import Backend, OpenAICompatibleClient
+from groq_client import GroqClient, GroqPool
+from metrics import CallTrace
+from scheduler import AdmissionScheduler
+
+logger = logging.getLogger(__name__)
+
+# Reasoning backends, comma separated, in order of preference until they've been measured:
+#   groq:<model>                        Groq, with GROQ_API_KEY
+#   openai:<model>@<base url>           any OpenAI-compatible server, e.g. llama.cpp or vLLM
+THINK_BACKENDS = os.environ.get(
+    "THINK_BACKENDS", "groq:qwen-qwq-32B,groq:deepseek-r1-distill-llama-70b"
+)
+# weight of the newest sample in the TTFT and tokens/sec moving averages
+THINK_ROUTER_ALPHA = float(os.environ.get("THINK_ROUTER_ALPHA", "0.3"))
+# seconds after which a backend nobody has picked gets a call again to re-measure it
+THINK_ROUTER_PROBE_INTERVAL = float(os.environ.get("THINK_ROUTER_PROBE_INTERVAL", "60"))
+# consecutive failures (errors or TTFT timeouts) before a backend is taken out of rotation
+THINK_BREAKER_FAILURES = int(os.environ.get("THINK_BREAKER_FAILURES", "3"))
+# seconds an ejected backend is skipped before one trial call is let through
+THINK_BREAKER_COOLDOWN = float(os.environ.get("THINK_BREAKER_COOLDOWN", "30"))
+
+
+def parse_backends(spec: str, pool: GroqPool) -> List[Backend]:
+    backends: List[Backend] = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        kind, _, rest = item.partition(":")
+        if kind == "groq" and rest:
+            # Groq models share the connection pool, but rate limits are per model, so
+            # each one has its own scheduler reading its own x-ratelimit headers
+            backends.append(GroqClient(rest, scheduler=AdmissionScheduler(), pool=pool))
+        elif kind == "openai" and "@" in rest:
+            model, _, base_url = rest.partition("@")
+            backends.append(OpenAICompatibleClient(model, base_url, scheduler=AdmissionScheduler()))
+        else:
+            raise ValueError(
+                f"Can't parse THINK_BACKENDS entry {item!r}, expected groq:<model> or openai:<model>@<base url>"
+            )
+    if not backends:
+        raise ValueError("THINK_BACKENDS is empty")
+    return backends
+
+
+class Ewma:
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def update(self, sample: float) -> None:
+        if self.value is None:
+            self.value = sample
+        else:
+            self.value = self.alpha * sample + (1 - self.alpha) * self.value
+
+
+class BackendState:
+    def __init__(self, backend: Backend, alpha: float):
+        self.backend = backend
+        self.ttft = Ewma(alpha)
+        self.tokens_per_second = Ewma(alpha)
+        self.failures = 0
+        self.open_until = 0.0
+        self.last_used = 0.0
+        self.inflight = 0
+
+
+# Sends each call to the backend expected to finish it soonest (EWMA TTFT plus a typical
+# call's reasoning tokens at its EWMA tokens/sec). Per backend circuit breaker: after
+# THINK_BREAKER_FAILURES consecutive failures it is skipped for THINK_BREAKER_COOLDOWN
+# seconds, then a single trial call decides whether it's back.
+class Router:
+    def __init__(
+        self,
+        backends: List[Backend],
+        alpha: float = THINK_ROUTER_ALPHA,
+        probe_interval: float = THINK_ROUTER_PROBE_INTERVAL,
+        max_failures: int = THINK_BREAKER_FAILURES,
+        cooldown: float = THINK_BREAKER_COOLDOWN,
+    ):
+        self.states: Dict[str, BackendState] = {b.name: BackendState(b, alpha) for b in backends}
+        self.probe_interval = probe_interval
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        # typical reasoning length, so backends are compared on the same amount of work
+        self.reasoning_tokens = Ewma(alpha)
+        # identifies the answers of this set of backends, e.g. in cache keys
+        self.namespace = ",".join(self.states)
+
+    @property
+    def backends(self) -> List[Backend]:
+        return [state.backend for state in self.states.values()]
+
+    def _available(self, state: BackendState, now: float) -> bool:
+        if state.failures < self.max_failures:
+            return True
+        # half open: one trial call once the cooldown is over
+        return now >= state.open_until and not state.inflight
+
+    def _expected_seconds(self, state: BackendState, now: float) -> float:
+        if state.ttft.value is None or now - state.last_used > self.probe_interval:
+            # unmeasured or stale: worth a call to find out, unless one is on its way
+            return math.inf if state.inflight else 0.0
+        rate = state.tokens_per_second.value
+        tokens = self.reasoning_tokens.value or 0.0
+        return state.ttft.value + (tokens / rate if rate else 0.0)
+
+    def ranked(self) -> List[Backend]:
+        now = time.monotonic()
+        healthy = [s for s in self.states.values() if self._available(s, now)]
+        if not healthy:
+            # everything is ejected: keep trying, the soonest to come back first
+            return [s.backend for s in sorted(self.states.values(), key=lambda s: s.open_until)]
+        # stable sort, configuration order breaks ties
+        healthy.sort(key=lambda s: self._expected_seconds(s, now))
+        return [s.backend for s in healthy]
+
+    def started(self, backend: Backend) -> None:
+        state = self.states[backend.name]
+        state.inflight += 1
+        state.last_used = time.monotonic()
+
+    def finished(self, backend: Backend, trace: CallTrace, ok: Optional[bool]) -> None:
+        # ok is None when the call was abandoned (lost a hedge, deadline, client cancelled),
+        # which says nothing about the backend
+        state = self.states[backend.name]
+        state.inflight -= 1
+        if ok is None:
+            return
+        if not ok:
+            state.failures += 1
+            if state.failures >= self.max_failures:
+                state.open_until = time.monotonic() + self.cooldown
+                logger.warning(
+                    f"Backend {backend.name} failed {state.failures} times in a row, "
+                    f"skipping it for {self.cooldown:g}s"
+                )
+            return
+        if state.failures >= self.max_failures:
+            logger.info(f"Backend {backend.name} is back")
+        state.failures = 0
+        if trace.first_token_at is not None:
+            state.ttft.update(trace.first_token_at - trace.started)
+        if trace.think_end_at is not None and trace.first_token_at is not None and trace.reasoning_tokens:
+            seconds = trace.think_end_at - trace.first_token_at
+            if seconds > 0:
+                state.tokens_per_second.update(trace.reasoning_tokens / seconds)
+            self.reasoning_tokens.update(trace.reasoning_tokens)
+
+    def outrun(self, backend: Backend, seconds: float) -> None:
+        # lost a hedge before its first token: its TTFT is at least this, which is
+        # enough to rank it behind the winner (e.g. stuck retrying a dead server)
+        self.states[backend.name].ttft.update(seconds)
+
+    def uses(self, kind: type) -> bool:
+        return any(isinstance(b, kind) for b in self.backends)
+
+    async def aclose(self) -> None:
+        for backend in self.backends:
+            await backend.aclose()
@@ -0,0 +1,174 @@
+import asyncio
+import itertools
+import math
+import os
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Mapping, Optional, Tuple, TypeVar
+
+# Admission control in front of the Groq API
+THINK_MAX_CONCURRENCY = int(os.environ.get("THINK_MAX_CONCURRENCY", "8"))
+THINK_MAX_RETRIES = int(os.environ.get("THINK_MAX_RETRIES", "4"))
+THINK_RETRY_BASE_DELAY = float(os.environ.get("THINK_RETRY_BASE_DELAY", "0.5"))
+THINK_RETRY_MAX_DELAY = float(os.environ.get("THINK_RETRY_MAX_DELAY", "30"))
+
+T = TypeVar("T")
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    # Groq reset headers look like "7.66s", "2m59.56s" or "1h2m3s"
+    parts = _DURATION.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(n) * _UNIT_SECONDS[unit] for n, unit in parts)
+
+
+class SingleFlight:
+    # Identical concurrent calls share one execution; every caller gets its result.
+    # The shared call is only cancelled once all of its callers have gone away.
+    class _Call:
+        def __init__(self, future: "asyncio.Future"):
+            self.future = future
+            self.waiters = 0
+
+    def __init__(self):
+        self._calls: Dict[str, SingleFlight._Call] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        # a finished call is only forgotten by its done callback, which may not have run yet
+        if call is None or call.future.done():
+            call = self._Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.future.add_done_callback(lambda _, c=call: self._forget(key, c))
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.future)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.future.done():
+                call.future.cancel()
+
+    def _forget(self, key: str, call: "SingleFlight._Call") -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+class TokenBucket:
+    # Unlimited until the API tells us its limits. Refill rate is whatever brings the
+    # bucket back to full exactly when the API says the window resets.
+    def __init__(self):
+        self.capacity = math.inf
+        self.level = math.inf
+        self.rate = 0.0
+        self.updated = time.monotonic()
+
+    def update(self, limit: float, remaining: float, reset_seconds: float) -> None:
+        self.capacity = limit
+        self.level = remaining
+        self.rate = (limit - remaining) / reset_seconds if reset_seconds > 0 else limit
+        self.updated = time.monotonic()
+
+    def wait_time(self, cost: float) -> float:
+        self._refill()
+        cost = min(cost, self.capacity)
+        if self.level >= cost:
+            return 0.0
+        if self.rate <= 0:
+            return 0.0
+        return (cost - self.level) / self.rate
+
+    def take(self, cost: float) -> None:
+        self._refill()
+        self.level -= min(cost, self.capacity)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate > 0 and self.level < self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class AdmissionScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = THINK_MAX_CONCURRENCY,
+        max_retries: int = THINK_MAX_RETRIES,
+        base_delay: float = THINK_RETRY_BASE_DELAY,
+        max_delay: float = THINK_RETRY_MAX_DELAY,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # admission is first come, first served
+        self._admission = asyncio.Lock()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self._slots:
+            yield
+
+    async def admit(self, cost_tokens: int) -> None:
+        async with self._admission:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(cost_tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(cost_tokens)
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}", ""))
+            if limit is None or remaining is None or reset is None:
+                continue
+            try:
+                bucket.update(float(limit), float(remaining), reset)
+            except ValueError:
+                continue
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        cost_tokens: int = 0,
+        status_errors: Tuple[type, ...] = (),
+        connection_errors: Tuple[type, ...] = (),
+    ) -> T:
+        # status_errors carry the HTTP response (.response), 429s and 5xx are retried
+        for attempt in itertools.count():
+            await self.admit(cost_tokens)
+            try:
+                return await fn()
+            except status_errors as e:
+                self.observe(e.response.headers)
+                status = e.response.status_code
+                if attempt >= self.max_retries or not (status == 429 or status >= 500):
+                    raise
+                retry_after = parse_duration(e.response.headers.get("retry-after", ""))
+                delay = self._backoff(attempt)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+            except connection_errors:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter" exponential backoff
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
@@ -1,52 +1,387 @@
-from typing import AsyncIterable, Dict, Any
-from groq_client import GroqClient
-from mcp.server.fastmcp import FastMCP
+import argparse
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Literal, Optional, Set, Tuple
+from weakref import WeakKeyDictionary
+from dotenv import load_dotenv
+
+# before the local imports below, they read their settings from the environment at import
+load_dotenv()
+
+from cache import THINK_CACHE, ResponseCache, cache_key
+from backends import Backend, RequestRejected
+from groq_client import GROQ_WARM_UP, GroqClient, GroqPool
+from hedging import THINK_HEDGE, LatencyWindow, hedge_delay, race
+from mcp.server.fastmcp import Context, FastMCP
+from condense import Condenser, OutputShape
+from limits import TRUNCATED, Limits
+from metrics import THINK_METRICS_PORT, CallTrace, Metrics
+from prompt_budget import THINK_PROMPT_SELECT, count_tokens, prompt_budget
+from router import THINK_BACKENDS, Router, parse_backends
+from scheduler import SingleFlight
+from session_memory import THINK_SESSION_MEMORY, SessionMemory, with_memory
+from system_prompt import THINK_PROMPT_RELOAD_INTERVAL, PromptStore
+from think_parser import Segment
+
+logger = logging.getLogger(__name__)
+
+# Forward reasoning to the MCP client as it is generated (log + progress notifications)
+THINK_STREAM = os.environ.get("THINK_STREAM", "1") != "0"
+THINK_STREAM_FLUSH_SIZE = int(os.environ.get("THINK_STREAM_FLUSH_SIZE", "128"))
+THINK_STREAM_FLUSH_INTERVAL = float(os.environ.get("THINK_STREAM_FLUSH_INTERVAL", "0.25"))
+
+# Serving: stdio (one process per client) or SSE (one process shared by many clients)
+THINK_TRANSPORT = os.environ.get("THINK_TRANSPORT", "stdio")
+THINK_HOST = os.environ.get("THINK_HOST", "127.0.0.1")
+THINK_PORT = int(os.environ.get("THINK_PORT", "8000"))
+THINK_SESSION_MAX_CONCURRENCY = int(os.environ.get("THINK_SESSION_MAX_CONCURRENCY", "4"))
+THINK_SHUTDOWN_GRACE = float(os.environ.get("THINK_SHUTDOWN_GRACE", "30"))
+
+# chain_of_thought_batch: prompts thought about at once per batch, and per call
+THINK_BATCH_CONCURRENCY = int(os.environ.get("THINK_BATCH_CONCURRENCY", "4"))
+THINK_BATCH_MAX_PROMPTS = int(os.environ.get("THINK_BATCH_MAX_PROMPTS", "16"))
+
+
+@dataclass
+class AppContext:
+    pool: GroqPool
+    cache: Optional[ResponseCache]
+    # identical prompts in flight at the same time share one upstream call
+    inflight: SingleFlight = field(default_factory=SingleFlight)
+    # observed time-to-first-token, drives the adaptive hedge delay
+    ttft: LatencyWindow = field(default_factory=LatencyWindow)
+    # per MCP session concurrency limits, dropped with the session
+    session_slots: "WeakKeyDictionary[Any, asyncio.Semaphore]" = field(
+        default_factory=WeakKeyDictionary
+    )
+    active_calls: int = 0
+    draining: bool = False
+    metrics: Metrics = field(default_factory=Metrics)
+    # digest of earlier thoughts per MCP session, dropped with the session
+    session_memory: "WeakKeyDictionary[Any, SessionMemory]" = field(
+        default_factory=WeakKeyDictionary
+    )
+    # None if THINK_BACKENDS doesn't parse, the error is then reported on every call
+    router: Optional[Router] = None
+    backends_error: Optional[str] = None
+    # the compiled system prompt, reloaded when prompts/system_prompt.json changes
+    prompts: PromptStore = field(default_factory=PromptStore)
+
 
 async def process_stream(
-    chunks: AsyncIterable[Dict[str, Any]], buffer_size: int = 128, print_output: bool = True
+    segments: AsyncIterable[Segment],
+    buffer_size: int = 128,
+    print_output: bool = True,
+    on_flush: Optional[Callable[[str], Awaitable[None]]] = None,
+    flush_interval: float = THINK_STREAM_FLUSH_INTERVAL,
+    output: Optional[List[str]] = None,
 ) -> str:
-    buffer = []  # We'll collect text pieces here
     current_size = 0
-    output = ""
-
-    async for chunk in chunks:
-        choices = chunk.get("choices")
-        delta = choices[0].get("delta")
-        text = delta.get("content") or delta.get("reasoning_content")
-        if text:
-            buffer.append(text)
-            current_size += len(text)
-            output += text
-            # If we pass the threshold, print and reset
-            if current_size >= buffer_size:
-                if print_output:
-                    print("".join(buffer), end="", flush=True)
-                buffer = []
-                current_size = 0
-
-    if buffer and print_output:
-        print("".join(buffer), end="", flush=True)
-
-    return output
-
-
-async def cot(prompt: str) -> str:
-    print(f"Thinking about {prompt}")
+    # joined once at the end, `output += text` is quadratic on long traces. A caller
+    # passing its own list can still read the partial text if the stream is cancelled.
+    output = [] if output is None else output
+    # output[flushed:] is what hasn't been sent yet
+    flushed = len(output)
+    # set by a timer rather than reading the clock for every segment; starts out True so
+    # the very first piece of text goes out immediately
+    due = True
+    timer: Optional[asyncio.TimerHandle] = None
+    loop = asyncio.get_running_loop()
+
+    def flush_due() -> None:
+        nonlocal due
+        due = True
+
+    async def flush() -> None:
+        nonlocal flushed
+        text = "".join(output[flushed:])
+        flushed = len(output)
+        if print_output:
+            print(text, end="", flush=True)
+        if on_flush is not None:
+            await on_flush(text)
+
     try:
-        models = ["deepseek-r1-distill-llama-70b", "qwen-qwq-32B"]
-        client = GroqClient(model=models[1])
-        stream = await client.reasoning_completion(
-            messages=[
-                {"role": "system", "content": NEW_SYSTEM_PROMPT},
-                {"role": "user", "content": prompt},
-            ],
-            thoughts_only=True,
-        )
+        async for segment in segments:
+            text = segment.text
+            if text:
+                output.append(text)
+                current_size += len(text)
+                # If we pass the size threshold or haven't flushed for a while, emit and reset
+                if current_size >= buffer_size or due:
+                    await flush()
+                    current_size = 0
+                    due = False
+                    if timer is not None:
+                        timer.cancel()
+                    timer = loop.call_later(flush_interval, flush_due)
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    if flushed < len(output):
+        await flush()
+
+    return "".join(output)
+
+
+async def cot(
+    prompt: str,
+    app: AppContext,
+    on_thought: Optional[Callable[[str], Awaitable[None]]] = None,
+    limits: Optional[Limits] = None,
+    memory: Optional[SessionMemory] = None,
+    output: Optional[OutputShape] = None,
+) -> str:
+    logger.debug(f"Thinking about {prompt}")
+    trace = CallTrace()
+    limits = limits or Limits()
+    output = output or OutputShape.resolve()
+    # fed the leader's thoughts as they stream, so little is left to do at the end
+    condenser = Condenser(output) if output.mode != "full" else None
+
+    def compact(thoughts: str) -> str:
+        if condenser is None:
+            return thoughts
+        thoughts = condenser.shape_text(thoughts, prompt)
+        trace.thought_tokens, trace.returned_tokens = condenser.before, condenser.after
+        return thoughts
 
-        response = await process_stream(stream, print_output=False)
-        return f"Hmmm, let me think for a second... {response}"
+    try:
+        if app.router is None:
+            raise ValueError(app.backends_error)
+        # fastest healthy backend first, the rest are backups
+        candidates = app.router.ranked()
+        trace.model = candidates[0].name
+        # taken once, a hot reload doesn't change the prompt of a running call
+        compiled = app.prompts.prompt
+        trace.prompt = compiled.hash
+        system_prompt = compiled.text
+        if THINK_PROMPT_SELECT:
+            system_prompt = prompt_budget(compiled.text).assemble(prompt)
+        # earlier conclusions from this session, part of the cache key like the prompt
+        user_prompt = with_memory(prompt, memory.recall(prompt)) if memory is not None else prompt
+        key = cache_key(user_prompt, app.router.namespace, system_prompt)
+        cached = await app.cache.get(key) if app.cache is not None else None
+        if app.cache is None:
+            trace.cache = "off"
+        elif cached is not None:
+            trace.cache = "hit"
+            if memory is not None:
+                memory.remember(prompt, cached)
+            return f"Hmmm, let me think for a second... {compact(cached)}"
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        cost_tokens = count_tokens(system_prompt) + count_tokens(user_prompt)
+        # the attempt whose thoughts are forwarded to the client: the first one to produce a
+        # token, so a hedged call doesn't interleave two streams
+        leader = None
+        attempts = {}
+        # each attempt's text so far, what's left of the leader's is returned on a deadline
+        partials: Dict[str, List[str]] = {}
+        running: Set[str] = set()
+        # characters of the leader's thoughts forwarded to the client so far
+        forwarded = 0
+
+        def promote(failed: str) -> Optional[str]:
+            # the leader failed: the running attempt furthest along takes over, or the next
+            # one to produce a first token if none has yet
+            nonlocal forwarded
+            forwarded = 0
+            behind = [n for n in running if n != failed and partials[n]]
+            return max(behind, key=lambda n: sum(map(len, partials[n])), default=None)
+        # the limit that cancelled the call, if any
+        expired = None
+        run: Optional[asyncio.Future] = None
+
+        def expire(reason: str) -> None:
+            nonlocal expired
+            if run is not None and not run.done() and expired is None:
+                expired = reason
+                run.cancel()
+
+        async def attempt(backend: Backend, started: asyncio.Event) -> str:
+            nonlocal leader
+            name = backend.name
+            attempts[name] = attempt_trace = CallTrace(model=name)
+            partials[name] = output = []
+            running.add(name)
+            ok = None
+            # the first token is timed from when the request goes out, waiting for a slot,
+            # admission and retry backoff are local and don't count. Running out of time
+            # fails this attempt only, race() moves on to the next backend.
+            ttft_timer: Optional[asyncio.TimerHandle] = None
+            timed_out = False
+            task = asyncio.current_task()
+
+            def no_first_token() -> None:
+                nonlocal timed_out
+                if not started.is_set():
+                    timed_out = True
+                    task.cancel()
+
+            def sent() -> None:
+                nonlocal ttft_timer
+                if ttft_timer is not None:
+                    ttft_timer.cancel()
+                if limits.ttft_timeout:
+                    ttft_timer = asyncio.get_running_loop().call_later(limits.ttft_timeout, no_first_token)
+
+            app.router.started(backend)
+            try:
+                async with backend.slot():
+                    start = time.monotonic()
+                    attempt_trace.queue_wait = start - attempt_trace.started
+                    stream = await backend.reasoning_completion(
+                        messages=messages,
+                        thoughts_only=True,
+                        cost_tokens=cost_tokens,
+                        trace=attempt_trace,
+                        max_reasoning_tokens=limits.max_reasoning_tokens,
+                        on_sent=sent,
+                    )
+
+                    async def first_token_tracked() -> AsyncIterator[Segment]:
+                        nonlocal leader
+                        async for segment in stream:
+                            if not started.is_set():
+                                app.ttft.record(time.monotonic() - start)
+                                started.set()
+                                if leader is None:
+                                    leader = name
+                            yield segment
+
+                    # characters of this attempt's thoughts flushed so far
+                    flushed = 0
+
+                    async def forward(text: str) -> None:
+                        nonlocal on_thought, flushed, forwarded
+                        before, flushed = flushed, flushed + len(text)
+                        if leader != name:
+                            return
+                        if forwarded < before:
+                            # took over from a leader that failed, catch up on what was dropped
+                            text = "".join(output)[forwarded:before] + text
+                        forwarded = flushed
+                        if condenser is not None:
+                            condenser.feed(text)
+                        if on_thought is not None:
+                            try:
+                                await on_thought(text)
+                            except Exception as e:
+                                # the client's session is gone or won't take notifications:
+                                # not the backend's fault, keep thinking without streaming
+                                logger.warning(f"Stopped streaming thoughts: {e!r}")
+                                on_thought = None
+
+                    try:
+                        response = await process_stream(
+                            first_token_tracked(),
+                            buffer_size=THINK_STREAM_FLUSH_SIZE,
+                            print_output=False,
+                            on_flush=forward,
+                            output=output,
+                        )
+                    except BaseException:
+                        # a deadline still returns the leader's partial thoughts
+                        if leader == name and not expired:
+                            leader = promote(name)
+                        raise
+                    finally:
+                        # close the upstream now rather than when the generator is collected,
+                        # e.g. when cancelled while forwarding thoughts to the client
+                        await stream.aclose()
+                    ok = True
+                    return response
+            except Exception as e:
+                if backend.rejected(e):
+                    # the caller's fault, e.g. a prompt over the context length: the backend
+                    # stays healthy and the others would refuse it too
+                    raise RequestRejected(str(e)) from e
+                ok = False
+                raise
+            except asyncio.CancelledError:
+                # losing a hedge or hitting the deadline isn't the backend's fault, not
+                # producing a first token in time for a request it actually received is
+                if timed_out and expired is None:
+                    ok = False
+                    raise TimeoutError(f"No reasoning within {limits.ttft_timeout:g}s") from None
+                if leader not in (None, name) and not started.is_set():
+                    app.router.outrun(backend, time.monotonic() - attempt_trace.started)
+                raise
+            finally:
+                running.discard(name)
+                if ttft_timer is not None:
+                    ttft_timer.cancel()
+                app.router.finished(backend, attempt_trace, ok)
+
+        async def thoughts() -> str:
+            # without hedging, a backup is only tried when the backends before it fail
+            index, response = await race(
+                [partial(attempt, b) for b in candidates],
+                hedge_delay(app.ttft) if THINK_HEDGE else None,
+                fatal=(RequestRejected,),
+            )
+            trace.hedged = len(attempts) > 1
+            trace.absorb(attempts[candidates[index].name])
+            return response
+
+        # the thoughts and the limit that cut them short, if any; joiners of an in-flight
+        # call get both, their own trace never sees the upstream stream
+        async def think() -> Tuple[str, Optional[str]]:
+            nonlocal run
+            run = asyncio.ensure_future(thoughts())
+            timers = []
+            if limits.deadline:
+                loop = asyncio.get_running_loop()
+                timers.append(loop.call_at(trace.started + limits.deadline, expire, "deadline"))
+            try:
+                response = await run
+            except asyncio.CancelledError:
+                if expired is None:
+                    raise
+                trace.truncated = expired
+                if leader is not None:
+                    trace.absorb(attempts[leader])
+                    trace.think_end_at = trace.think_end_at or time.monotonic()
+                response = "".join(partials.get(leader, []))
+            finally:
+                for timer in timers:
+                    timer.cancel()
+                run.cancel()
+
+            if trace.truncated:
+                # partial thoughts are returned but never cached
+                return response + TRUNCATED.format(reason=trace.truncated), trace.truncated
+            if app.cache is not None:
+                app.cache.set(key, response)
+            return response, None
+
+        # callers joining an identical in-flight call get its result, not its stream
+        response, truncated = await app.inflight.do(f"{key}:{limits}", think)
+        trace.truncated = truncated
+        if not attempts:
+            # joined another caller's think(), whose trace has the upstream timings
+            trace.cache = "shared"
+        if memory is not None and not trace.truncated:
+            memory.remember(prompt, response)
+        return f"Hmmm, let me think for a second... {compact(response)}"
     except Exception as e:
+        trace.error = type(e).__name__
         return f"Error: {e}"
+    except asyncio.CancelledError:
+        trace.error = "CancelledError"
+        raise
+    finally:
+        app.metrics.record(trace)
 
 
 SYSTEM_PROMPT = """
@@ -125,242 +460,273 @@ You, Claude, tend to be overeager, much like a junior engineer who is smart but
 </behavior>
 """
 
-NEW_SYSTEM_PROMPT = """
-You are Claude 3.7 Sonnet, a powerful and helpful assistant that can help with a wide range of tasks. You operate exclusively in Cursor, the world's best IDE. 
-
-You specifically, are designed for "thinking deeply" about a task. You are connected to an execution engine that will act on your thoughts.
-
-The execution engine has access to a codebase and certain tools.
-
-<functions>
-<function>{"description": "Find snippets of code from the codebase most relevant to the search query.\nThis is a semantic search tool, so the query should ask for something semantically matching what is needed.\nIf it makes sense to only search in particular directories, please specify them in the target_directories field.\nUnless there is a clear reason to use your own search query, please just reuse the user's exact query with their wording.\nTheir exact wording/phrasing can often be helpful for the semantic search query. Keeping the same exact question format can also be helpful.", "name": "codebase_search", "parameters": {"properties": {"explanation": {"description": "One sentence explanation as to why this tool is being used, and how it contributes to the goal.", "type": "string"}, "query": {"description": "The search query to find relevant code. You should reuse the user's exact query/most recent message with their wording unless there is a clear reason not to.", "type": "string"}, "target_directories": {"description": "Glob patterns for directories to search over", "items": {"type": "string"}, "type": "array"}}, "required": ["query"], "type": "object"}}</function>
-<function>{"description": "Read the contents of a file. the output of this tool call will be the 1-indexed file contents from start_line_one_indexed to end_line_one_indexed_inclusive, together with a summary of the lines outside start_line_one_indexed and end_line_one_indexed_inclusive.\nNote that this call can view at most 250 lines at a time.\n\nWhen using this tool to gather information, it's your responsibility to ensure you have the COMPLETE context. Specifically, each time you call this command you should:\n1) Assess if the contents you viewed are sufficient to proceed with your task.\n2) Take note of where there are lines not shown.\n3) If the file contents you have viewed are insufficient, and you suspect they may be in lines not shown, proactively call the tool again to view those lines.\n4) When in doubt, call this tool again to gather more information. Remember that partial file views may miss critical dependencies, imports, or functionality.\n\nIn some cases, if reading a range of lines is not enough, you may choose to read the entire file.\nReading entire files is often wasteful and slow, especially for large files (i.e. more than a few hundred lines). So you should use this option sparingly.\nReading the entire file is not allowed in most cases. You are only allowed to read the entire file if it has been edited or manually attached to the conversation by the user.", "name": "read_file", "parameters": {"properties": {"end_line_one_indexed_inclusive": {"description": "The one-indexed line number to end reading at (inclusive).", "type": "integer"}, "explanation": {"description": "One sentence explanation as to why this tool is being used, and how it contributes to the goal.", "type": "string"}, "should_read_entire_file": {"description": "Whether to read the entire file. Defaults to false.", "type": "boolean"}, "start_line_one_indexed": {"description": "The one-indexed line number to start reading from (inclusive).", "type": "integer"}, "target_file": {"description": "The path of the file to read. You can use either a relative path in the workspace or an absolute path. If an absolute path is provided, it will be preserved as is.", "type": "string"}}, "required": ["target_file", "should_read_entire_file", "start_line_one_indexed", "end_line_one_indexed_inclusive"], "type": "object"}}</function>
-<function>{"description": "PROPOSE a command to run on behalf of the user.\nIf you have this tool, note that you DO have the ability to run commands directly on the USER's system.\nNote that the user will have to approve the command before it is executed.\nThe user may reject it if it is not to their liking, or may modify the command before approving it.  If they do change it, take those changes into account.\nThe actual command will NOT execute until the user approves it. The user may not approve it immediately. Do NOT assume the command has started running.\nIf the step is WAITING for user approval, it has NOT started running.\nIn using these tools, adhere to the following guidelines:\n1. Based on the contents of the conversation, you will be told if you are in the same shell as a previous step or a different shell.\n2. If in a new shell, you should `cd` to the appropriate directory and do necessary setup in addition to running the command.\n3. If in the same shell, the state will persist (eg. if you cd in one step, that cwd is persisted next time you invoke this tool).\n4. For ANY commands that would use a pager or require user interaction, you should append ` | cat` to the command (or whatever is appropriate). Otherwise, the command will break. You MUST do this for: git, less, head, tail, more, etc.\n5. For commands that are long running/expected to run indefinitely until interruption, please run them in the background. To run jobs in the background, set `is_background` to true rather than changing the details of the command.\n6. Dont include any newlines in the command.", "name": "run_terminal_cmd", "parameters": {"properties": {"command": {"description": "The terminal command to execute", "type": "string"}, "explanation": {"description": "One sentence explanation as to why this command needs to be run and how it contributes to the goal.", "type": "string"}, "is_background": {"description": "Whether the command should be run in the background", "type": "boolean"}, "require_user_approval": {"description": "Whether the user must approve the command before it is executed. Only set this to false if the command is safe and if it matches the user's requirements for commands that should be executed automatically.", "type": "boolean"}}, "required": ["command", "is_background", "require_user_approval"], "type": "object"}}</function>
-<function>{"description": "List the contents of a directory. The quick tool to use for discovery, before using more targeted tools like semantic search or file reading. Useful to try to understand the file structure before diving deeper into specific files. Can be used to explore the codebase.", "name": "list_dir", "parameters": {"properties": {"explanation": {"description": "One sentence explanation as to why this tool is being used, and how it contributes to the goal.", "type": "string"}, "relative_workspace_path": {"description": "Path to list contents of, relative to the workspace root.", "type": "string"}}, "required": ["relative_workspace_path"], "type": "object"}}</function>
-<function>{"description": "Fast text-based regex search that finds exact pattern matches within files or directories, utilizing the ripgrep command for efficient searching.\nResults will be formatted in the style of ripgrep and can be configured to include line numbers and content.\nTo avoid overwhelming output, the results are capped at 50 matches.\nUse the include or exclude patterns to filter the search scope by file type or specific paths.\n\nThis is best for finding exact text matches or regex patterns.\nMore precise than semantic search for finding specific strings or patterns.\nThis is preferred over semantic search when we know the exact symbol/function name/etc. to search in some set of directories/file types.", "name": "grep_search", "parameters": {"properties": {"case_sensitive": {"description": "Whether the search should be case sensitive", "type": "boolean"}, "exclude_pattern": {"description": "Glob pattern for files to exclude", "type": "string"}, "explanation": {"description": "One sentence explanation as to why this tool is being used, and how it contributes to the goal.", "type": "string"}, "include_pattern": {"description": "Glob pattern for files to include (e.g. '*.ts' for TypeScript files)", "type": "string"}, "query": {"description": "The regex pattern to search for", "type": "string"}}, "required": ["query"], "type": "object"}}</function>
-<function>{"description": "Use this tool to propose an edit to an existing file.\n\nThis will be read by a less intelligent model, which will quickly apply the edit. You should make it clear what the edit is, while also minimizing the unchanged code you write.\nWhen writing the edit, you should specify each edit in sequence, with the special comment `// ... existing code ...` to represent unchanged code in between edited lines.\n\nFor example:\n\n```\n// ... existing code ...\nFIRST_EDIT\n// ... existing code ...\nSECOND_EDIT\n// ... existing code ...\nTHIRD_EDIT\n// ... existing code ...\n```\n\nYou should still bias towards repeating as few lines of the original file as possible to convey the change.\nBut, each edit should contain sufficient context of unchanged lines around the code you're editing to resolve ambiguity.\nDO NOT omit spans of pre-existing code (or comments) without using the `// ... existing code ...` comment to indicate its absence. If you omit the existing code comment, the model may inadvertently delete these lines.\nMake sure it is clear what the edit should be, and where it should be applied.\n\nYou should specify the following arguments before the others: [target_file]", "name": "edit_file", "parameters": {"properties": {"code_edit": {"description": "Specify ONLY the precise lines of code that you wish to edit. **NEVER specify or write out unchanged code**. Instead, represent all unchanged code using the comment of the language you're editing in - example: `// ... existing code ...`", "type": "string"}, "instructions": {"description": "A single sentence instruction describing what you are going to do for the sketched edit. This is used to assist the less intelligent model in applying the edit. Please use the first person to describe what you are going to do. Dont repeat what you have said previously in normal messages. And use it to disambiguate uncertainty in the edit.", "type": "string"}, "target_file": {"description": "The target file to modify. Always specify the target file as the first argument. You can use either a relative path in the workspace or an absolute path. If an absolute path is provided, it will be preserved as is.", "type": "string"}}, "required": ["target_file", "instructions", "code_edit"], "type": "object"}}</function>
-<function>{"description": "Fast file search based on fuzzy matching against file path. Use if you know part of the file path but don't know where it's located exactly. Response will be capped to 10 results. Make your query more specific if need to filter results further.", "name": "file_search", "parameters": {"properties": {"explanation": {"description": "One sentence explanation as to why this tool is being used, and how it contributes to the goal.", "type": "string"}, "query": {"description": "Fuzzy filename to search for", "type": "string"}}, "required": ["query", "explanation"], "type": "object"}}</function>
-<function>{"description": "Deletes a file at the specified path. The operation will fail gracefully if:\n    - The file doesn't exist\n    - The operation is rejected for security reasons\n    - The file cannot be deleted", "name": "delete_file", "parameters": {"properties": {"explanation": {"description": "One sentence explanation as to why this tool is being used, and how it contributes to the goal.", "type": "string"}, "target_file": {"description": "The path of the file to delete, relative to the workspace root.", "type": "string"}}, "required": ["target_file"], "type": "object"}}</function>
-<function>{"description": "Calls a smarter model to apply the last edit to the specified file.\nUse this tool immediately after the result of an edit_file tool call ONLY IF the diff is not what you expected, indicating the model applying the changes was not smart enough to follow your instructions.", "name": "reapply", "parameters": {"properties": {"target_file": {"description": "The relative path to the file to reapply the last edit to. You can use either a relative path in the workspace or an absolute path. If an absolute path is provided, it will be preserved as is.", "type": "string"}}, "required": ["target_file"], "type": "object"}}</function>
-<function>{"description": "Search the web for real-time information about any topic. Use this tool when you need up-to-date information that might not be available in your training data, or when you need to verify current facts. The search results will include relevant snippets and URLs from web pages. This is particularly useful for questions about current events, technology updates, or any topic that requires recent information.", "name": "web_search", "parameters": {"properties": {"explanation": {"description": "One sentence explanation as to why this tool is being used, and how it contributes to the goal.", "type": "string"}, "search_term": {"description": "The search term to look up on the web. Be specific and include relevant keywords for better results. For technical queries, include version numbers or dates if relevant.", "type": "string"}}, "required": ["search_term"], "type": "object"}}</function>
-<function>{"description": "Retrieve the history of recent changes made to files in the workspace. This tool helps understand what modifications were made recently, providing information about which files were changed, when they were changed, and how many lines were added or removed. Use this tool when you need context about recent modifications to the codebase.", "name": "diff_history", "parameters": {"properties": {"explanation": {"description": "One sentence explanation as to why this tool is being used, and how it contributes to the goal.", "type": "string"}}, "required": [], "type": "object"}}</function>
-</functions>
-
-It also has access to additional user defined "model contact protocol" (or mcp). The execution agent always knows what user defined tools are availablel, but you don't. Take this into account when thinking. 
+@asynccontextmanager
+async def app_context() -> AsyncIterator[AppContext]:
+    # Only cheap setup here: the lifespan is entered before the MCP initialize response
+    # is sent, so anything slow goes into the background warm-up below.
+    pool = GroqPool()
+    cache = ResponseCache() if THINK_CACHE else None
+    metrics = Metrics()
+    if THINK_METRICS_PORT:
+        try:
+            await metrics.serve()
+        except OSError as e:
+            # e.g. the port is taken; thinking matters more than being scraped
+            logger.warning(f"Not serving metrics on port {THINK_METRICS_PORT}: {e!r}")
+    router, backends_error = None, None
+    try:
+        router = Router(parse_backends(THINK_BACKENDS, pool))
+    except ValueError as e:
+        backends_error = str(e)
+        logger.error(backends_error)
+    prompts = PromptStore()
+    warm = asyncio.ensure_future(warm_up(pool, router, prompts))
+    watch = asyncio.ensure_future(watch_prompt(prompts)) if THINK_PROMPT_RELOAD_INTERVAL > 0 else None
+    try:
+        yield AppContext(
+            pool=pool, cache=cache, metrics=metrics,
+            router=router, backends_error=backends_error, prompts=prompts,
+        )
+    finally:
+        warm.cancel()
+        if watch is not None:
+            watch.cancel()
+        metrics.close()
+        if router is not None:
+            await router.aclose()
+        await pool.aclose()
+        if cache is not None:
+            logger.info(f"Response cache stats: {cache.stats()}")
+            cache.close()
+
+
+async def warm_up(pool: GroqPool, router: Optional[Router], prompts: PromptStore) -> None:
+    # Runs next to the handshake; a call arriving first just does this work itself.
+    try:
+        if THINK_PROMPT_SELECT:
+            budget = await asyncio.to_thread(prompt_budget, prompts.prompt.text)
+            sections = ", ".join(f"{name}={tokens}" for name, tokens in budget.report())
+            logger.info(f"System prompt: ~{budget.total_tokens} tokens ({sections})")
+        if router is not None and router.uses(GroqClient):
+            # importing the groq SDK and building the client, off the event loop
+            await asyncio.to_thread(lambda: pool.client)
+            if GROQ_WARM_UP:
+                await pool.warm_up()
+    except Exception as e:
+        # e.g. a missing API key, reported again (as a tool error) on the first call
+        logger.warning(f"Groq warm-up failed: {e}")
+    if router is None:
+        return
+    for backend in router.backends:
+        if isinstance(backend, GroqClient):
+            continue
+        try:
+            await backend.warm_up()
+        except Exception as e:
+            logger.warning(f"{backend.name} warm-up failed: {e}")
+
+
+async def watch_prompt(prompts: PromptStore) -> None:
+    # picks up a recompiled system prompt without a restart; the new one is indexed for
+    # selection before it's swapped in, and calls already running keep theirs
+    prepare = prompt_budget if THINK_PROMPT_SELECT else None
+    while True:
+        await asyncio.sleep(THINK_PROMPT_RELOAD_INTERVAL)
+        try:
+            await asyncio.to_thread(prompts.reload, prepare)
+        except Exception as e:
+            logger.error(f"System prompt reload failed: {e!r}")
+
+
+# set by sse_lifespan: one AppContext (pool, cache, backends) shared by every session
+shared_app: Optional[AppContext] = None
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[AppContext]:
+    # runs once per MCP session: for stdio that's the whole process, over SSE it's
+    # every client connection, which must not get its own pool and cache
+    if shared_app is not None:
+        yield shared_app
+        return
+    async with app_context() as app:
+        yield app
+
+
+mcp = FastMCP("think", lifespan=lifespan)
+
+
+@asynccontextmanager
+async def admitted(app: AppContext, session: Any) -> AsyncIterator[None]:
+    if app.draining:
+        raise RuntimeError("Server is shutting down, retry on another instance")
+    slots = app.session_slots.get(session)
+    if slots is None:
+        slots = app.session_slots[session] = asyncio.Semaphore(THINK_SESSION_MAX_CONCURRENCY)
+    app.active_calls += 1
+    try:
+        async with slots:
+            yield
+    finally:
+        app.active_calls -= 1
 
-<behavior>
-Here's the updated AI Behavior Prompt covering all 23 problems from the "AI Blindspots" document. I've removed bold styling, ensured XML closing tags, and included an overview section summarizing all issues. The structure remains concise and uses bullets as requested.
-AI Behavior Prompt
-<overview>  
-This prompt addresses 23 behavioral issues with AI models, primarily Sonnet 3.7, as detailed in the "AI Blindspots" document (March 2025). These problems reflect the AI's tendencies to:  
-- Duplicate code excessively instead of refactoring (Rule of Three).  
-- Stick to pretrained styles over codebase norms (Culture Eats Strategy).  
-- Attempt tasks beyond its tools, inventing broken solutions (Know Your Limits).  
-- Focus on minor details, losing the main goal (The tail wagging the dog).  
-- Guess bug fixes randomly instead of reasoning (Scientific Debugging).  
-- Misinterpret tasks due to no memory or context (Memento).  
-- Alter specs (e.g., tests, APIs) without permission (Respect the Spec).  
-- Derail in broken environments (Mise en Place).  
-- Misuse MCP servers or hallucinate commands (Use MCP Servers).  
-- Ignore static type benefits or struggle with strict typing (Use Static Types).  
-- Not prioritize minimal end-to-end systems (Walking Skeleton).  
-- Hallucinate docs for niche frameworks (Read the Docs).  
-- Struggle with large files, breaking patches (Keep Files Small).  
-- Fail at mechanical formatting rules (Use Automatic Code Formatting).  
-- Assume solutions without requirements (Requirements, not Solutions).  
-- Over-rely on brute force without oversight (Bulldozer Method).  
-- Mishandle stateful tools like shell (Stateless Tools).  
-- Bundle unrelated refactors with changes (Preparatory Refactoring).  
-- Overfit tests to implementation (Black Box Testing).  
-- Persist on doomed tasks without pivoting (Stop Digging).  
-The goal is to align the AI with user intent, enhance efficiency, and minimize unintended deviations.  
-</overview>
-
-<behavioral_adjustments>  
-
-<Rule_of_Three>  
-- Issue: AI duplicates code (e.g., tests, programs) instead of refactoring by the third instance.  
-- Fix:  
-  - Spot duplication on third occurrence and refactor.  
-  - Use helpers in tests or mods.  
-  - Ask, “Refactor okay?” if unsure.  
-- How to Apply: Check outputs for repetition; suggest consolidated code with confirmation.  
-</Rule_of_Three>  
-
-<Culture_Eats_Strategy>  
-- Issue: AI uses pretrained style (e.g., sync Python) over codebase norms.  
-- Fix:  
-  - Match context style (e.g., async if present).  
-  - Skip pretrained defaults unless prompted.  
-- How to Apply: Scan context for patterns (e.g., async keywords) and adopt them.  
-</Culture_Eats_Strategy>  
-
-<Know_Your_Limits>  
-- Issue: AI tries unsupported tasks (e.g., shell calls) with flawed workarounds.  
-- Fix:  
-  - Say, “I can't [X]—need tool/info.”  
-  - Avoid inventing calls or scripts.  
-- How to Apply: Verify tools first; flag unsupported actions immediately.  
-</Know_Your_Limits>  
-
-<The_tail_wagging_the_dog>  
-- Issue: AI fixates on minor details, forgetting the main task.  
-- Fix:  
-  - Focus on user's stated goal.  
-  - Ignore irrelevant context unless tied to task.  
-- How to Apply: Re-check prompt each step to stay aligned.  
-</The_tail_wagging_the_dog>  
-
-<Scientific_Debugging>  
-- Issue: AI guesses fixes randomly instead of reasoning systematically.  
-- Fix:  
-  - List assumptions, test step-by-step.  
-  - Ask, “Can I see error log?” if stuck.  
-- How to Apply: Break issues into parts; explain fixes briefly.  
-</Scientific_Debugging>  
-
-<Memento>  
-- Issue: AI misinterprets tasks due to no memory or missing context.  
-- Fix:  
-  - Request files/docs if context lacks them.  
-  - Restate task in replies for clarity.  
-- How to Apply: Start with, “For [task], here's [action].”  
-</Memento>  
-
-<Respect_the_Spec>  
-- Issue: AI changes specs (e.g., deletes tests, alters APIs) without approval.  
-- Fix:  
-  - Keep specs unless told to change.  
-  - Note, “This alters [X]—confirm?” for edits.  
-- How to Apply: Compare edits to intent; flag deviations.  
-</Respect_the_Spec>  
-
-<Mise_en_Place>  
-- Issue: AI flounders in broken environments, derailing on fixes.  
-- Fix:  
-  - Assume working setup; pause if issues arise.  
-  - Ask, “Is [tool] installed?” when needed.  
-- How to Apply: Stop at errors (e.g., missing imports); seek input.  
-</Mise_en_Place>  
-
-<Use_MCP_Servers>  
-- Issue: AI misuses MCP or hallucinates commands (e.g., wrong npm runs).  
-- Fix:  
-  - Use MCP for context/tools only when valid.  
-  - Say, “Need correct command—provide it?” if unsure.  
-- How to Apply: Validate MCP calls against project; avoid guesses.  
-</Use_MCP_Servers>  
-
-<Use_Static_Types>  
-- Issue: AI ignores static typing benefits or mishandles strict settings.  
-- Fix:  
-  - Apply types from context (e.g., TypeScript strict).  
-  - Ask, “Use types here?” if unclear.  
-- How to Apply: Check codebase for type usage; mirror it.  
-</Use_Static_Types>  
-
-<Walking_Skeleton>  
-- Issue: AI doesn't prioritize minimal end-to-end systems first.  
-- Fix:  
-  - Suggest basic system if task is broad.  
-  - Say, “Start with skeleton?” if unsure.  
-- How to Apply: Outline minimal flow before details.  
-</Walking_Skeleton>  
-
-<Read_the_Docs>  
-- Issue: AI hallucinates docs for niche frameworks.  
-- Fix:  
-  - Ask, “Got docs for [X]?” if unsure.  
-  - Use provided docs over guesses.  
-- How to Apply: Pause for doc input on unknown topics.  
-</Read_the_Docs>  
-
-<Keep_Files_Small>  
-- Issue: AI struggles with large files, breaking patches.  
-- Fix:  
-  - Split edits into smaller files if over 128KB.  
-  - Note, “File too big—split it?” if needed.  
-- How to Apply: Check file size; suggest splits early.  
-</Keep_Files_Small>  
-
-<Use_Automatic_Code_Formatting>  
-- Issue: AI fails at mechanical formatting rules.  
-- Fix:  
-  - Defer formatting to tools (e.g., black).  
-  - Focus on logic, not style.  
-- How to Apply: Skip formatting edits; assume tool handles it.  
-</Use_Automatic_Code_Formatting>  
-
-<Requirements_not_Solutions>  
-- Issue: AI assumes solutions without full requirements.  
-- Fix:  
-  - Ask, “What's [X] requirement?” if vague.  
-  - Follow given constraints over defaults.  
-- How to Apply: Clarify specs before acting.  
-</Requirements_not_Solutions>  
-
-<Bulldozer_Method>  
-- Issue: AI overuses brute force without oversight.  
-- Fix:  
-  - Propose plan for big tasks.  
-  - Note, “Brute forcing—check this?” after.  
-- How to Apply: Outline steps; seek review on repeats.  
-</Bulldozer_Method>  
-
-<Stateless_Tools>  
-- Issue: AI mishandles stateful tools (e.g., shell cwd).  
-- Fix:  
-  - Assume single-dir commands.  
-  - Ask, “Which dir to use?” if state unclear.  
-- How to Apply: Avoid state changes; clarify context.  
-</Stateless_Tools>  
-
-<Preparatory_Refactoring>  
-Issue: AI bundles unrelated refactors with changes.  
-Fix:  
-Split refactors into separate steps.  
-Say, “Refactor first—okay?” if needed.
-How to Apply: Propose refactors before main edits.
-</Preparatory_Refactoring>
-<Black_Box_Testing>  
-- Issue: AI overfits tests to implementation.  
-- Fix:  
-  - Keep test logic independent.  
-  - Note, “Using impl here—bad?” if tempted.  
-- How to Apply: Avoid impl details in tests.  
-</Black_Box_Testing>  
-
-<Stop_Digging>  
-- Issue: AI persists on doomed tasks without pivoting.  
-- Fix:  
-  - Pause and ask, “This hard—replan?” if stuck.  
-  - Suggest prereqs if detected.  
-- How to Apply: Flag struggles early; propose shifts.  
-</Stop_Digging>  
-
-</behavioral_adjustments>  
-
-<baseline_rules>  
-- Keep replies short, clear.  
-- Use bullets for steps/options.  
-- Stay neutral, task-focused.  
-</baseline_rules>  
-
-<fallbacks>  
-- Unclear input: “Can you specify [X]?”  
-- Beyond ability: “I can't [X], but [Y]—okay?”  
-</fallbacks>  
 
-</behavior>
+def session_memory(app: AppContext, session: Any) -> Optional[SessionMemory]:
+    if not THINK_SESSION_MEMORY:
+        return None
+    memory = app.session_memory.get(session)
+    if memory is None:
+        memory = app.session_memory[session] = SessionMemory()
+    return memory
 
-"""
 
-mcp = FastMCP("think")
+@mcp.tool()
+async def chain_of_thought(
+    prompt: str,
+    ctx: Context,
+    max_reasoning_tokens: Optional[int] = None,
+    deadline_seconds: Optional[float] = None,
+    ttft_timeout_seconds: Optional[float] = None,
+    output_mode: Optional[Literal["full", "dedup", "condensed"]] = None,
+    output_max_tokens: Optional[int] = None,
+) -> str:
+    app: AppContext = ctx.request_context.lifespan_context
+    on_thought = None
+    if THINK_STREAM:
+        streamed = 0
+
+        async def on_thought(text: str) -> None:
+            nonlocal streamed
+            streamed += len(text)
+            await ctx.log("info", text, logger_name="chain_of_thought")
+            # progress is only sent when the client asked for it with a progress token
+            await ctx.report_progress(streamed)
+
+    limits = Limits.resolve(max_reasoning_tokens, deadline_seconds, ttft_timeout_seconds)
+    try:
+        output = OutputShape.resolve(output_mode, output_max_tokens)
+    except ValueError as e:
+        return f"Error: {e}"
+    async with admitted(app, ctx.session):
+        return await cot(prompt, app, on_thought, limits, session_memory(app, ctx.session), output)
 
 
 @mcp.tool()
-async def chain_of_thought(prompt: str) -> str:
-    return await cot(prompt)
+async def chain_of_thought_batch(
+    prompts: List[str],
+    ctx: Context,
+    max_reasoning_tokens: Optional[int] = None,
+    deadline_seconds: Optional[float] = None,
+    ttft_timeout_seconds: Optional[float] = None,
+    output_mode: Optional[Literal["full", "dedup", "condensed"]] = None,
+    output_max_tokens: Optional[int] = None,
+) -> str:
+    """Think about several independent prompts at once, e.g. one per candidate fix or per file.
+    Results come back in the order of `prompts`; one failing prompt doesn't fail the others."""
+    app: AppContext = ctx.request_context.lifespan_context
+    if not prompts:
+        return "Error: no prompts given"
+    if len(prompts) > THINK_BATCH_MAX_PROMPTS:
+        return f"Error: at most {THINK_BATCH_MAX_PROMPTS} prompts per batch, got {len(prompts)}"
+    limits = Limits.resolve(max_reasoning_tokens, deadline_seconds, ttft_timeout_seconds)
+    try:
+        output = OutputShape.resolve(output_mode, output_max_tokens)
+    except ValueError as e:
+        return f"Error: {e}"
+    memory = session_memory(app, ctx.session)
+    slots = asyncio.Semaphore(THINK_BATCH_CONCURRENCY)
+    done = 0
+
+    async def one(index: int, prompt: str) -> str:
+        nonlocal done
+        on_thought = None
+        if THINK_STREAM:
+            async def on_thought(text: str) -> None:
+                await ctx.log("info", text, logger_name=f"chain_of_thought_batch[{index}]")
+
+        async with slots:
+            result = await cot(prompt, app, on_thought, limits, memory, output)
+        done += 1
+        # progress counts finished prompts, streamed thoughts are tagged with their index
+        await ctx.report_progress(done, len(prompts))
+        return result
+
+    async with admitted(app, ctx.session):
+        results = await asyncio.gather(
+            *(one(i, p) for i, p in enumerate(prompts)), return_exceptions=True
+        )
+    sections = []
+    for i, (prompt, result) in enumerate(zip(prompts, results)):
+        if isinstance(result, BaseException):
+            result = f"Error: {result!r}"
+        title = prompt.strip().splitlines()[0][:80] if prompt.strip() else ""
+        sections.append(f"## [{i}] {title}\n{result}")
+    return "\n\n".join(sections)
+
+
+@asynccontextmanager
+async def sse_lifespan(starlette_app: Any) -> AsyncIterator[None]:
+    global shared_app
+    async with app_context() as shared_app:
+        yield
+    shared_app = None
+
+
+def serve_sse(host: str, port: int) -> None:
+    # imported here, stdio servers never need them
+    import uvicorn
+    from sse_starlette.sse import AppStatus
+
+    class DrainingServer(uvicorn.Server):
+        # On SIGINT/SIGTERM: stop accepting connections, refuse new tool calls and let the
+        # in-flight ones finish (up to THINK_SHUTDOWN_GRACE seconds) before uvicorn closes
+        # the long-lived SSE connections.
+        def handle_exit(self, sig: int, frame: Any) -> None:
+            # sse_starlette hooks uvicorn's signal handler to end every SSE stream right
+            # away, which would drop the results of running calls; skip it until drained
+            AppStatus.original_handler(self, sig, frame)
+
+        async def shutdown(self, sockets: Optional[list] = None) -> None:
+            for server in self.servers:
+                server.close()
+            app = shared_app
+            if app is not None:
+                app.draining = True
+                deadline = time.monotonic() + THINK_SHUTDOWN_GRACE
+                while app.active_calls and time.monotonic() < deadline and not self.force_exit:
+                    await asyncio.sleep(0.1)
+                if app.active_calls:
+                    logger.warning(f"Shutting down with {app.active_calls} call(s) still running")
+            AppStatus.should_exit = True
+            if AppStatus.should_exit_event is not None:
+                AppStatus.should_exit_event.set()
+            await super().shutdown(sockets)
+
+    starlette_app = mcp.sse_app()
+    starlette_app.router.lifespan_context = sse_lifespan
+    config = uvicorn.Config(
+        starlette_app,
+        host=host,
+        port=port,
+        log_level=mcp.settings.log_level.lower(),
+        # the SSE streams never end on their own, close them once calls have drained
+        timeout_graceful_shutdown=1,
+    )
+    DrainingServer(config).run()
+
 
 if __name__ == "__main__":
-    mcp.run(transport='stdio')
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "sse"],
+        default=THINK_TRANSPORT,
+        help="stdio: one process per client (default); sse: one long-lived server for many clients",
+    )
+    parser.add_argument("--host", default=THINK_HOST)
+    parser.add_argument("--port", type=int, default=THINK_PORT)
+    args = parser.parse_args()
+    if args.transport == "sse":
+        serve_sse(args.host, args.port)
+    else:
+        mcp.run(transport='stdio')
@@ -0,0 +1,119 @@
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple
+
+from bm25 import BM25, terms
+from prompt_budget import count_tokens
+
+# Carry a digest of earlier thoughts in the same MCP session into follow-up calls
+THINK_SESSION_MEMORY = os.environ.get("THINK_SESSION_MEMORY", "0") != "0"
+# earlier calls remembered per session, least recently used are dropped first
+THINK_SESSION_MEMORY_ENTRIES = int(os.environ.get("THINK_SESSION_MEMORY_ENTRIES", "8"))
+# estimated tokens kept of each call's conclusions
+THINK_SESSION_MEMORY_ENTRY_TOKENS = int(os.environ.get("THINK_SESSION_MEMORY_ENTRY_TOKENS", "150"))
+# max estimated tokens of memory prepended to a prompt
+THINK_SESSION_MEMORY_MAX_TOKENS = int(os.environ.get("THINK_SESSION_MEMORY_MAX_TOKENS", "600"))
+# seconds after which an unused entry is forgotten
+THINK_SESSION_MEMORY_IDLE = float(os.environ.get("THINK_SESSION_MEMORY_IDLE", "1800"))
+# drop entries scoring below this fraction of the most relevant one
+THINK_SESSION_MEMORY_MIN_RELEVANCE = float(os.environ.get("THINK_SESSION_MEMORY_MIN_RELEVANCE", "0.25"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def tail(text: str, max_tokens: int) -> str:
+    # Conclusions are at the end of a reasoning trace: keep whole sentences from the end,
+    # cutting into the first one kept only if it alone is over budget.
+    kept: List[str] = []
+    budget = max_tokens
+    for sentence in reversed([s for s in _SENTENCE_END.split(text.strip()) if s.strip()]):
+        tokens = count_tokens(sentence)
+        if tokens > budget:
+            if not kept:
+                starts = [m.start() for m in _TOKEN.finditer(sentence)]
+                kept.append("..." + sentence[starts[-budget]:] if budget > 0 else "")
+            break
+        kept.append(sentence)
+        budget -= tokens
+    return " ".join(reversed(kept))
+
+
+class Entry(NamedTuple):
+    prompt: str
+    digest: str
+    terms: List[str]
+    tokens: int
+    used: float
+
+
+class SessionMemory:
+    def __init__(
+        self,
+        max_entries: int = THINK_SESSION_MEMORY_ENTRIES,
+        entry_tokens: int = THINK_SESSION_MEMORY_ENTRY_TOKENS,
+        idle: float = THINK_SESSION_MEMORY_IDLE,
+    ):
+        self.max_entries = max_entries
+        self.entry_tokens = entry_tokens
+        self.idle = idle
+        # insertion order is recency of use, oldest first
+        self.entries: "OrderedDict[str, Entry]" = OrderedDict()
+
+    def remember(self, prompt: str, thoughts: str) -> None:
+        digest = tail(thoughts, self.entry_tokens)
+        if not digest:
+            return
+        title = prompt.strip().splitlines()[0][:200] if prompt.strip() else ""
+        self.entries.pop(prompt, None)
+        self.entries[prompt] = Entry(
+            title, digest, terms(prompt + " " + digest),
+            count_tokens(title) + count_tokens(digest), time.monotonic(),
+        )
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def recall(
+        self,
+        prompt: str,
+        max_tokens: int = THINK_SESSION_MEMORY_MAX_TOKENS,
+        min_relevance: float = THINK_SESSION_MEMORY_MIN_RELEVANCE,
+    ) -> str:
+        self._expire()
+        keys = [k for k in self.entries if k != prompt]
+        if not keys:
+            return ""
+        entries = [self.entries[k] for k in keys]
+        scores = BM25([e.terms for e in entries]).scores(terms(prompt))
+        best = max(scores)
+        # the latest call is almost always the same task, keep it even without overlap
+        ranked = [len(entries) - 1] + sorted(
+            (i for i, score in enumerate(scores) if score > 0 and score >= best * min_relevance),
+            key=lambda i: -scores[i],
+        )
+        included = set()
+        for i in ranked:
+            if i not in included and entries[i].tokens <= max_tokens:
+                included.add(i)
+                max_tokens -= entries[i].tokens
+        now = time.monotonic()
+        for i in sorted(included):
+            self.entries.move_to_end(keys[i])
+            self.entries[keys[i]] = entries[i]._replace(used=now)
+        return "\n".join(
+            f"- Asked: {entries[i].prompt}\n  Concluded: {entries[i].digest}"
+            for i in sorted(included)
+        )
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.idle
+        for key in [k for k, e in self.entries.items() if e.used < cutoff]:
+            del self.entries[key]
+
+
+def with_memory(prompt: str, memory: str) -> str:
+    if not memory:
+        return prompt
+    return f"Earlier thoughts in this session, for context:\n{memory}\n\nNow think about:\n{prompt}"
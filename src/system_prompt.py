@@ -0,0 +1,147 @@
+# Compiles the system prompt from prompts/ (template, tool schemas, behavior rules) into a
+# content-hashed artifact, which the server loads and reloads when it changes on disk.
+#
+#   uv run src/system_prompt.py            # rebuild prompts/system_prompt.json
+#   uv run src/system_prompt.py --check    # fail if it's out of date with its sources
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# directory with template.txt, tools.json and behavior.txt
+THINK_PROMPT_SOURCES = os.environ.get("THINK_PROMPT_SOURCES", os.path.join(_ROOT, "prompts"))
+# the compiled artifact the server runs with
+THINK_PROMPT_PATH = os.environ.get(
+    "THINK_PROMPT_PATH", os.path.join(THINK_PROMPT_SOURCES, "system_prompt.json")
+)
+# seconds between checks of the artifact for changes (0: only load it at startup)
+THINK_PROMPT_RELOAD_INTERVAL = float(os.environ.get("THINK_PROMPT_RELOAD_INTERVAL", "2"))
+
+SOURCES = ("template.txt", "tools.json", "behavior.txt")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class CompiledPrompt(NamedTuple):
+    hash: str
+    text: str
+
+
+def compile_prompt(sources: str = THINK_PROMPT_SOURCES) -> Dict[str, Any]:
+    contents = {}
+    for name in SOURCES:
+        with open(os.path.join(sources, name), encoding="utf-8") as f:
+            contents[name] = f.read()
+    template = contents["template.txt"]
+    if "{{" in template.replace("{{functions}}", "").replace("{{behavior}}", ""):
+        raise ValueError("template.txt has placeholders other than {{functions}} and {{behavior}}")
+    # one schema per line
+    functions = "".join(
+        f"<function>{json.dumps(tool, ensure_ascii=False)}</function>\n"
+        for tool in json.loads(contents["tools.json"])
+    )
+    text = template.replace("{{functions}}", functions).replace("{{behavior}}", contents["behavior.txt"])
+    return {
+        "hash": content_hash(text),
+        "sources": {name: content_hash(content) for name, content in contents.items()},
+        "system_prompt": text,
+    }
+
+
+def write_artifact(artifact: Dict[str, Any], path: str = THINK_PROMPT_PATH) -> None:
+    # written next to the target and renamed over it, a running server never reads half a file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".system_prompt.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(artifact, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_artifact(path: str = THINK_PROMPT_PATH) -> CompiledPrompt:
+    with open(path, encoding="utf-8") as f:
+        artifact = json.load(f)
+    text = artifact["system_prompt"]
+    if content_hash(text) != artifact["hash"]:
+        raise ValueError(f"{path}: system_prompt doesn't match its hash, edit the sources and recompile")
+    return CompiledPrompt(artifact["hash"], text)
+
+
+# The current system prompt. Calls take it once when they start, so a reload never changes
+# the prompt of a call that's already running.
+class PromptStore:
+    def __init__(self, path: str = THINK_PROMPT_PATH, sources: str = THINK_PROMPT_SOURCES):
+        self.path = path
+        self._stamp = self._stat()
+        try:
+            self.prompt = load_artifact(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Can't load {path} ({e!r}), compiling the system prompt from {sources}")
+            artifact = compile_prompt(sources)
+            self.prompt = CompiledPrompt(artifact["hash"], artifact["system_prompt"])
+        logger.info(f"System prompt {self.prompt.hash}")
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def reload(self, prepare: Optional[Callable[[str], Any]] = None) -> bool:
+        # Blocking, run it off the event loop. `prepare` gets the new text before it's
+        # swapped in, e.g. to index it so the first call with it doesn't pay for that.
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            prompt = load_artifact(self.path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Keeping system prompt {self.prompt.hash}, can't load {self.path}: {e!r}")
+            return False
+        if prompt.hash == self.prompt.hash:
+            return False
+        if prepare is not None:
+            prepare(prompt.text)
+        logger.info(f"System prompt reloaded: {self.prompt.hash} -> {prompt.hash}")
+        self.prompt = prompt
+        return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile the system prompt artifact")
+    parser.add_argument("--sources", default=THINK_PROMPT_SOURCES)
+    parser.add_argument("--output", default=THINK_PROMPT_PATH)
+    parser.add_argument("--check", action="store_true", help="exit 1 if the artifact is out of date")
+    args = parser.parse_args()
+
+    artifact = compile_prompt(args.sources)
+    if args.check:
+        try:
+            current = load_artifact(args.output)
+        except (OSError, ValueError, KeyError) as e:
+            sys.exit(f"{args.output}: {e!r}")
+        if current.hash != artifact["hash"]:
+            sys.exit(f"{args.output} is {current.hash}, the sources compile to {artifact['hash']}")
+        print(f"{args.output} is up to date ({current.hash})")
+        return
+    write_artifact(artifact, args.output)
+    print(f"{args.output}: {artifact['hash']}")
+
+
+if __name__ == "__main__":
+    main()
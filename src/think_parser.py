@@ -0,0 +1,67 @@
+from typing import List, NamedTuple
+
+REASONING = "reasoning"
+ANSWER = "answer"
+
+OPEN_TAG = "<think>"
+CLOSE_TAG = "</think>"
+
+
+class Segment(NamedTuple):
+    kind: str  # REASONING or ANSWER
+    text: str
+
+
+# skips NamedTuple's Python-level __new__, this runs once per streamed token
+_segment = tuple.__new__
+
+
+# Incremental splitter for a `<think>...</think>` stream. Tags may arrive split
+# across any number of chunks, so a trailing piece of text that could still be the
+# start of a tag is held back until the next chunk (or `flush`) decides what it is.
+class ThinkParser:
+    __slots__ = ("in_think", "think_closed", "pending")
+
+    def __init__(self) -> None:
+        self.in_think = False
+        self.think_closed = False
+        # held back text that may be the start of a tag
+        self.pending = ""
+
+    def feed(self, text: str) -> List[Segment]:
+        if self.pending:
+            text = self.pending + text
+            self.pending = ""
+        kind = REASONING if self.in_think else ANSWER
+        # fast path: the vast majority of chunks can't contain or start a tag
+        if "<" not in text:
+            return [_segment(Segment, (kind, text))] if text else []
+
+        segments = []
+        pos = 0
+        while True:
+            tag = CLOSE_TAG if self.in_think else OPEN_TAG
+            idx = text.find(tag, pos)
+            if idx == -1:
+                break
+            if idx > pos:
+                segments.append(_segment(Segment, (kind, text[pos:idx])))
+            if self.in_think:
+                self.think_closed = True
+            self.in_think = not self.in_think
+            kind = REASONING if self.in_think else ANSWER
+            pos = idx + len(tag)
+
+        end = len(text)
+        lt = text.rfind("<", max(pos, end - len(tag) + 1))
+        if lt != -1 and tag.startswith(text[lt:]):
+            end = lt
+            self.pending = text[lt:]
+        if end > pos:
+            segments.append(_segment(Segment, (kind, text[pos:end])))
+        return segments
+
+    def flush(self) -> List[Segment]:
+        # end of stream: whatever was held back was never a tag
+        text, self.pending = self.pending, ""
+        return [Segment(REASONING if self.in_think else ANSWER, text)] if text else []
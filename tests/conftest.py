@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the server's modules import each other by name, as when run with `uv run src/server.py`
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Sequence
+
+from backends import Backend
+from groq_client import GroqPool
+from metrics import Metrics
+from router import Router
+from scheduler import AdmissionScheduler
+from server import AppContext
+
+THOUGHTS = ("<think>", "first", " second", "</think>", "answer")
+
+
+# A backend that streams `script` after `ttft` seconds (never, with ttft=None), one
+# item every `token_delay` seconds, or raises `error` when it opens
+class FakeBackend(Backend):
+    def __init__(
+        self,
+        name: str,
+        script: Sequence[str] = THOUGHTS,
+        ttft: Optional[float] = 0.0,
+        token_delay: float = 0.0,
+        error: Optional[BaseException] = None,
+        fail_after: Optional[int] = None,
+    ):
+        super().__init__(name, name, AdmissionScheduler(max_retries=0))
+        self.script = script
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.error = error
+        # raise `error` after this many items instead of when opening
+        self.fail_after = fail_after
+        self.calls = 0
+
+    async def open(self, messages: List[Dict[str, Any]]) -> Any:
+        self.calls += 1
+        if self.error is not None and self.fail_after is None:
+            raise self.error
+        return None
+
+    def headers(self, response: Any) -> Mapping[str, str]:
+        return {}
+
+    async def chunks(self, response: Any) -> AsyncIterator[str]:
+        if self.ttft is None:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(self.ttft)
+        for i, item in enumerate(self.script):
+            if i == self.fail_after:
+                raise self.error
+            yield item
+            await asyncio.sleep(self.token_delay)
+
+    async def close(self, response: Any) -> None:
+        pass
+
+
+def app_with(*backends: Backend, **router_options: Any) -> AppContext:
+    return AppContext(
+        pool=GroqPool(), cache=None, metrics=Metrics(trace_path=None),
+        router=Router(list(backends), **router_options),
+    )
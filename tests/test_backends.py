@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from fakes import FakeBackend
+from think_parser import ANSWER, REASONING
+
+
+def stream(script, thoughts_only=True):
+    async def main():
+        segments = await FakeBackend("fake", script).reasoning_completion([], thoughts_only=thoughts_only)
+        return [segment async for segment in segments]
+
+    return asyncio.run(main())
+
+
+def text(segments, kind):
+    return "".join(s.text for s in segments if s.kind == kind)
+
+
+@pytest.mark.parametrize("script", [
+    ["<think>", "a", " b", "</think>done"],
+    ["<think>a b</think>done"],
+    ["<think>a", " b</th", "ink>done", " more"],
+    # how OpenAICompatibleClient.chunks() closes reasoning_content
+    ["<think>a", " b", "</think>" + "done"],
+])
+def test_thoughts_only_drops_answer_text_after_the_close(script):
+    segments = stream(script)
+    assert text(segments, REASONING) == "a b"
+    assert text(segments, ANSWER) == ""
+
+
+def test_full_stream_keeps_the_answer():
+    segments = stream(["<think>a b</think>done", " more"], thoughts_only=False)
+    assert text(segments, REASONING) == "a b"
+    assert text(segments, ANSWER) == "done more"
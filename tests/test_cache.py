@@ -0,0 +1,59 @@
+import asyncio
+import threading
+
+from cache import ResponseCache
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path, memory_size=1)
+    cache.set("a", "first")
+    cache.set("b", "second")
+    # "a" was pushed out of memory, it comes back from disk
+    assert asyncio.run(cache.get("a")) == "first"
+    assert asyncio.run(cache.get("b")) == "second"
+    assert asyncio.run(cache.get("c")) is None
+    assert cache.stats()["disk_hits"] >= 1
+    cache.close()
+
+    # queued writes are flushed on close
+    reopened = ResponseCache(path)
+    assert asyncio.run(reopened.get("b")) == "second"
+    reopened.close()
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=0)
+    cache.set("a", "value")
+    assert asyncio.run(cache.get("a")) is None
+    cache.close()
+
+
+def test_eviction_keeps_the_most_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), memory_size=0, max_entries=2, evict_interval=0)
+    for key in "abc":
+        cache.set(key, key)
+    assert [asyncio.run(cache.get(key)) for key in "abc"] == [None, "b", "c"]
+    cache.close()
+
+
+def test_disk_access_runs_off_the_event_loop(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), memory_size=0)
+    threads = set()
+    disk_get = cache._disk_get
+
+    def recording_get(*args):
+        threads.add(threading.current_thread())
+        return disk_get(*args)
+
+    cache._disk_get = recording_get
+    asyncio.run(cache.get("a"))
+    assert threads and threading.main_thread() not in threads
+    cache.close()
+
+
+def test_memory_only_cache():
+    cache = ResponseCache(None)
+    cache.set("a", "value")
+    assert asyncio.run(cache.get("a")) == "value"
+    cache.close()
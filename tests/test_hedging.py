@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from hedging import LatencyWindow, race
+
+
+def attempt(result, first_token=None, finish=0.0, fail=False, log=None):
+    async def run(started: asyncio.Event):
+        try:
+            if first_token is not None:
+                await asyncio.sleep(first_token)
+                started.set()
+            await asyncio.sleep(finish)
+            if fail:
+                raise RuntimeError(result)
+            return result
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(result)
+            raise
+
+    return run
+
+
+def test_primary_with_a_first_token_in_time_isnt_hedged():
+    launched = []
+
+    def backup(started):
+        launched.append("backup")
+        return attempt("backup")(started)
+
+    result = asyncio.run(race([attempt("primary", first_token=0.01, finish=0.05), backup], 0.03))
+    assert result == (0, "primary")
+    assert launched == []
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    cancelled = []
+    result = asyncio.run(race(
+        [attempt("primary", first_token=1.0, log=cancelled), attempt("backup", first_token=0.0)],
+        0.02,
+    ))
+    assert result == (1, "backup")
+    assert cancelled == ["primary"]
+
+
+def test_without_a_delay_backups_only_run_on_failure():
+    result = asyncio.run(race(
+        [attempt("primary", first_token=0.05, fail=True), attempt("backup")], None
+    ))
+    assert result == (1, "backup")
+
+
+def test_failure_after_a_first_token_still_uses_the_backup():
+    result = asyncio.run(race(
+        [attempt("primary", first_token=0.0, finish=0.01, fail=True), attempt("backup")], 10.0
+    ))
+    assert result == (1, "backup")
+
+
+def test_last_error_is_raised_when_every_attempt_fails():
+    with pytest.raises(RuntimeError, match="backup"):
+        asyncio.run(race([attempt("primary", fail=True), attempt("backup", fail=True)], None))
+
+
+def test_latency_window_needs_enough_samples():
+    window = LatencyWindow(size=10, min_samples=5)
+    for seconds in (1, 2, 3, 4):
+        window.record(seconds)
+    assert window.percentile(0.95) is None
+    window.record(5)
+    assert window.percentile(0.95) == 5
+    assert window.percentile(0.0) == 1
+
+
+def test_cancelling_the_race_leaves_no_tasks_behind():
+    async def main():
+        run = asyncio.ensure_future(race([attempt("primary", first_token=10), attempt("backup")], 5))
+        await asyncio.sleep(0.01)
+        run.cancel()
+        await asyncio.gather(run, return_exceptions=True)
+        await asyncio.sleep(0)
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    assert asyncio.run(main()) == []
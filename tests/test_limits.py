@@ -0,0 +1,38 @@
+import pytest
+
+from limits import Limits
+
+
+@pytest.fixture
+def defaults(monkeypatch):
+    # server-wide defaults as if set with THINK_MAX_REASONING_TOKENS=100,
+    # THINK_DEADLINE=60 and THINK_TTFT_TIMEOUT=10
+    monkeypatch.setattr(Limits.__new__, "__defaults__", (100, 60.0, 10.0))
+    assert Limits() == Limits(100, 60.0, 10.0)
+
+
+def test_no_request_keeps_the_defaults(defaults):
+    assert Limits.resolve() == Limits(100, 60.0, 10.0)
+    assert Limits.resolve(0, -1, None) == Limits(100, 60.0, 10.0)
+
+
+def test_requests_tighten_the_defaults(defaults):
+    assert Limits.resolve(50, 0.5, 0.25) == Limits(50, 0.5, 0.25)
+
+
+def test_requests_cant_loosen_the_defaults(defaults):
+    assert Limits.resolve(1000, 600.0, 100.0) == Limits(100, 60.0, 10.0)
+
+
+def test_each_limit_resolves_on_its_own(defaults):
+    assert Limits.resolve(deadline=5.0) == Limits(100, 5.0, 10.0)
+
+
+def test_a_disabled_default_takes_the_request(monkeypatch):
+    monkeypatch.setattr(Limits.__new__, "__defaults__", (0, 0.0, 0.0))
+    assert Limits.resolve() == Limits(0, 0.0, 0.0)
+    assert Limits.resolve(5000, 300.0, 45.0) == Limits(5000, 300.0, 45.0)
+
+
+def test_token_limit_is_an_integer(defaults):
+    assert type(Limits.resolve(50.0).max_reasoning_tokens) is int
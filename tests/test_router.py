@@ -0,0 +1,129 @@
+from types import SimpleNamespace
+
+import pytest
+
+import router as router_module
+from fakes import FakeBackend
+from metrics import CallTrace
+from router import Router
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(router_module, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def make_router(*names, **options):
+    backends = [FakeBackend(name) for name in names]
+    return Router(backends, **{"alpha": 1.0, "max_failures": 2, "cooldown": 30.0, **options}), backends
+
+
+def call(router, backend, clock, ok=True, ttft=1.0, seconds=1.0, tokens=100):
+    router.started(backend)
+    trace = CallTrace(started=clock.value)
+    trace.first_token_at = clock.value + ttft
+    trace.think_end_at = trace.first_token_at + seconds
+    trace.reasoning_tokens = tokens
+    router.finished(backend, trace, ok)
+
+
+def names(backends):
+    return [b.name for b in backends]
+
+
+def test_unmeasured_backends_keep_their_configured_order(clock):
+    router, _ = make_router("a", "b")
+    assert names(router.ranked()) == ["a", "b"]
+
+
+def test_ranks_by_expected_time_to_finish(clock):
+    router, (a, b) = make_router("a", "b")
+    # a: fast to start, 50 tokens/s; b: slower to start, 1000 tokens/s
+    call(router, a, clock, ttft=0.5, seconds=2.0, tokens=100)
+    call(router, b, clock, ttft=1.0, seconds=0.1, tokens=100)
+    # 0.5 + 100/50 = 2.5s against 1.0 + 100/1000 = 1.1s
+    assert names(router.ranked()) == ["b", "a"]
+
+
+def test_stale_backend_is_probed_again(clock):
+    router, (a, b) = make_router("a", "b", probe_interval=60.0)
+    call(router, a, clock, ttft=0.1)
+    call(router, b, clock, ttft=5.0)
+    assert names(router.ranked()) == ["a", "b"]
+    clock.value += 30
+    call(router, a, clock, ttft=0.1)
+    clock.value += 31
+    assert names(router.ranked()) == ["b", "a"]
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    router, (a, b) = make_router("a", "b")
+    call(router, a, clock, ok=False)
+    assert names(router.ranked()) == ["a", "b"]
+    call(router, a, clock, ok=False)
+    assert names(router.ranked()) == ["b"]
+
+
+def test_success_resets_the_failure_count(clock):
+    router, (a, _) = make_router("a", "b")
+    call(router, a, clock, ok=False)
+    call(router, a, clock)
+    call(router, a, clock, ok=False)
+    assert "a" in names(router.ranked())
+
+
+def test_abandoned_calls_say_nothing_about_the_backend(clock):
+    router, (a, _) = make_router("a", "b")
+    for _ in range(3):
+        call(router, a, clock, ok=None)
+    assert router.states["a"].failures == 0
+
+
+def test_half_open_allows_one_trial_call_then_recovers(clock):
+    router, (a, b) = make_router("a", "b")
+    call(router, a, clock, ok=False)
+    call(router, a, clock, ok=False)
+    clock.value += 31
+    assert "a" in names(router.ranked())
+    # while the trial call runs nobody else is sent to it
+    router.started(a)
+    assert names(router.ranked()) == ["b"]
+    trace = CallTrace(started=clock.value)
+    trace.first_token_at = clock.value + 0.1
+    router.finished(a, trace, True)
+    assert router.states["a"].failures == 0
+    assert "a" in names(router.ranked())
+
+
+def test_failed_trial_call_opens_the_breaker_again(clock):
+    router, (a, b) = make_router("a", "b")
+    call(router, a, clock, ok=False)
+    call(router, a, clock, ok=False)
+    clock.value += 31
+    call(router, a, clock, ok=False)
+    assert names(router.ranked()) == ["b"]
+    clock.value += 29
+    assert names(router.ranked()) == ["b"]
+    clock.value += 2
+    assert "a" in names(router.ranked())
+
+
+def test_everything_ejected_tries_the_soonest_back_first(clock):
+    router, (a, b) = make_router("a", "b")
+    call(router, b, clock, ok=False)
+    call(router, b, clock, ok=False)
+    clock.value += 5
+    call(router, a, clock, ok=False)
+    call(router, a, clock, ok=False)
+    assert names(router.ranked()) == ["b", "a"]
+
+
+def test_outrun_hedge_loser_ranks_behind_the_winner(clock):
+    router, (a, b) = make_router("a", "b")
+    call(router, b, clock, ttft=0.2, seconds=0.1)
+    router.started(a)
+    router.outrun(a, 3.0)
+    router.finished(a, CallTrace(started=clock.value), None)
+    assert names(router.ranked()) == ["b", "a"]
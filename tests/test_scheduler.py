@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from scheduler import SingleFlight, TokenBucket, parse_duration
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("7.66s", 7.66),
+    ("2m59.56s", 179.56),
+    ("1h2m3s", 3723.0),
+    ("250ms", 0.25),
+    ("12", 12.0),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+
+def test_parse_duration_of_garbage():
+    assert parse_duration("soon") is None
+
+
+def test_token_bucket_is_unlimited_until_updated():
+    bucket = TokenBucket()
+    bucket.take(1_000_000)
+    assert bucket.wait_time(1_000_000) == 0.0
+
+
+def test_token_bucket_waits_for_the_refill():
+    bucket = TokenBucket()
+    # 100 per 10s window with 10 left: refills at 9 per second
+    bucket.update(limit=100, remaining=10, reset_seconds=10)
+    assert bucket.wait_time(10) == 0.0
+    bucket.take(10)
+    assert bucket.wait_time(9) == pytest.approx(1.0, abs=0.01)
+    # a cost above the capacity only waits for a full bucket
+    assert bucket.wait_time(1000) == pytest.approx(100 / 9, abs=0.01)
+
+
+def test_single_flight_shares_one_call():
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(flight.do("k", fn), flight.do("k", fn))
+
+    assert asyncio.run(main()) == ["result", "result"]
+    assert len(calls) == 1
+
+
+def test_single_flight_keeps_running_while_a_caller_waits():
+    async def main():
+        flight = SingleFlight()
+        fn_done = asyncio.Event()
+
+        async def fn():
+            await asyncio.sleep(0.02)
+            fn_done.set()
+            return "result"
+
+        first = asyncio.ensure_future(flight.do("k", fn))
+        second = asyncio.ensure_future(flight.do("k", fn))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "result"
+        assert fn_done.is_set()
+
+    asyncio.run(main())
+
+
+def test_single_flight_cancels_the_call_when_no_callers_are_left():
+    async def main():
+        flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def fn():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.ensure_future(flight.do("k", fn)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+        async def again():
+            return "again"
+
+        # the next identical call starts afresh
+        assert await flight.do("k", again) == "again"
+
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+import pytest
+
+from fakes import FakeBackend, app_with
+from limits import Limits
+import server
+from server import cot
+
+
+def test_ttft_timeout_fails_over_to_the_next_backend():
+    stuck, healthy = FakeBackend("stuck", ttft=None), FakeBackend("healthy")
+    app = app_with(stuck, healthy)
+    limits = Limits(0, 10.0, 0.05)
+    for i in range(3):
+        result = asyncio.run(cot(f"prompt {i}", app, limits=limits))
+        assert result.endswith("first second"), result
+    # every call still succeeded, the stuck backend is ejected like any failing one
+    assert app.router.states["stuck"].failures == 3
+    assert healthy.calls == 3
+
+
+def test_ttft_timeout_on_every_backend_fails_the_call():
+    app = app_with(FakeBackend("a", ttft=None), FakeBackend("b", ttft=None))
+    result = asyncio.run(cot("prompt", app, limits=Limits(0, 10.0, 0.05)))
+    assert result == "Error: No reasoning within 0.05s"
+
+
+def status_error(status):
+    request = httpx.Request("POST", "http://backend/v1/chat/completions")
+    return httpx.HTTPStatusError(f"{status}", request=request, response=httpx.Response(status, request=request))
+
+
+def test_rejected_request_is_not_a_backend_failure():
+    a, b = FakeBackend("a", error=status_error(400)), FakeBackend("b")
+    app = app_with(a, b)
+    for i in range(3):
+        assert asyncio.run(cot(f"prompt {i}", app)) == "Error: 400"
+    # not resent to the other backend, and nobody is ejected
+    assert b.calls == 0
+    assert {name: state.failures for name, state in app.router.states.items()} == {"a": 0, "b": 0}
+
+
+@pytest.mark.parametrize("status", [401, 404, 429, 503])
+def test_backend_fault_statuses_fail_over(status):
+    a, b = FakeBackend("a", error=status_error(status)), FakeBackend("b")
+    app = app_with(a, b)
+    assert asyncio.run(cot("prompt", app)).endswith("first second")
+    assert app.router.states["a"].failures == 1
+
+
+def test_backend_without_a_scheduler():
+    backend = FakeBackend("a")
+    backend.scheduler = None
+    assert asyncio.run(cot("prompt", app_with(backend))).endswith("first second")
+
+
+def test_backup_takes_over_when_the_leader_fails(monkeypatch):
+    monkeypatch.setattr(server, "THINK_HEDGE", True)
+    monkeypatch.setattr(server, "hedge_delay", lambda ttft: 0.02)
+    # a starts first and leads, b is hedged and streams until the deadline
+    a = FakeBackend(
+        "a", ["<think>"] + [f" A{i}" for i in range(20)], ttft=0.05, token_delay=0.01,
+        error=RuntimeError("a died"), fail_after=10,
+    )
+    b = FakeBackend("b", ["<think>"] + [f" B{i}" for i in range(500)], ttft=0.06, token_delay=0.01)
+    thoughts = []
+
+    async def on_thought(text):
+        thoughts.append(text)
+
+    result = asyncio.run(cot("prompt", app_with(a, b), on_thought, Limits(0, 0.6, 0)))
+    assert result.startswith("Hmmm, let me think for a second...  B0 B1")
+    assert result.endswith("[Reasoning truncated: deadline]")
+    # the client got a's thoughts, then all of b's from the start
+    streamed = "".join(thoughts)
+    assert streamed.startswith(" A0")
+    assert " B0 B1 B2" in streamed
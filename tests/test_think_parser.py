@@ -0,0 +1,60 @@
+import random
+
+from think_parser import ANSWER, REASONING, Segment, ThinkParser
+
+TEXT = "<think>first, the parser</think>The answer"
+
+
+def parse(chunks):
+    parser = ThinkParser()
+    segments = []
+    for chunk in chunks:
+        segments.extend(parser.feed(chunk))
+    segments.extend(parser.flush())
+    return parser, segments
+
+
+def joined(segments, kind):
+    return "".join(s.text for s in segments if s.kind == kind)
+
+
+def test_whole_text():
+    parser, segments = parse([TEXT])
+    assert segments == [Segment(REASONING, "first, the parser"), Segment(ANSWER, "The answer")]
+    assert parser.think_closed
+
+
+def test_tags_split_one_character_per_chunk():
+    parser, segments = parse(list(TEXT))
+    assert joined(segments, REASONING) == "first, the parser"
+    assert joined(segments, ANSWER) == "The answer"
+    assert parser.think_closed
+
+
+def test_tags_split_at_random_points():
+    rng = random.Random(0)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(TEXT)), rng.randint(1, 8)))
+        chunks = [TEXT[i:j] for i, j in zip([0] + cuts, cuts + [len(TEXT)])]
+        _, segments = parse(chunks)
+        assert joined(segments, REASONING) == "first, the parser", chunks
+        assert joined(segments, ANSWER) == "The answer", chunks
+
+
+def test_held_back_text_is_released_when_it_is_not_a_tag():
+    parser = ThinkParser()
+    assert parser.feed("<think>a <") == [Segment(REASONING, "a ")]
+    assert parser.pending == "<"
+    assert parser.feed("b") == [Segment(REASONING, "<b")]
+    assert parser.pending == ""
+
+
+def test_unfinished_tag_at_the_end_is_text():
+    _, segments = parse(["<think>a </thi"])
+    assert joined(segments, REASONING) == "a </thi"
+
+
+def test_no_think_block():
+    parser, segments = parse(["just ", "an answer"])
+    assert joined(segments, ANSWER) == "just an answer"
+    assert not parser.think_closed